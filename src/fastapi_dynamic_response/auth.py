@@ -1,13 +1,31 @@
+import asyncio
 from fastapi import HTTPException, Request
 from functools import wraps
+import hashlib
+import hmac
+import os
 from starlette.authentication import AuthCredentials, AuthenticationBackend, SimpleUser
-from typing import Dict
+from typing import Dict, FrozenSet, Iterable, Optional, Tuple
 
-# In-memory user database for demonstration purposes
+from fastapi_dynamic_response.cache import LRUCache
+from fastapi_dynamic_response.constant import PROBE_PATHS, STATIC_PREFIX
+from fastapi_dynamic_response.settings import settings
+
+# In-memory user database for demonstration purposes, passwords are stored as
+# pbkdf2 hashes (see hash_password), the plaintext demo logins are in the justfile
 AUTH_DB: Dict[str, str] = {
-    "user1": "password123",
-    "user2": "securepassword",
-    "user3": "supersecurepassword",
+    "user1": (
+        "pbkdf2_sha256$200000$b02c507900a36a7a8bf10d7aa30760ab$"
+        "ace500168a94a7fef264d5cd663fae0683616f960944601b4fa26e12dd6cbec3"
+    ),
+    "user2": (
+        "pbkdf2_sha256$200000$757cb6a50d9a8f0a14651b4b9ade479c$"
+        "f7e99d41f671116d68d8a1495b8ffc57e1231b08134f95a137c88d41e8d219ec"
+    ),
+    "user3": (
+        "pbkdf2_sha256$200000$9771dc854b5be4b22cf400abe2945bce$"
+        "b7264738d542c9294424cfb63d06f6f6922acae33ec08dfe3ea831de1a52bf9a"
+    ),
 }
 
 SCOPES = {
@@ -16,12 +34,87 @@ SCOPES = {
     "superuser": "Superuser",
 }
 
-USER_SCOPES = {
-    "user1": ["authenticated"],
-    "user2": ["authenticated", "admin"],
-    "user3": ["authenticated", "admin", "superuser"],
+USER_SCOPES: Dict[str, FrozenSet[str]] = {
+    "user1": frozenset({"authenticated"}),
+    "user2": frozenset({"authenticated", "admin"}),
+    "user3": frozenset({"authenticated", "admin", "superuser"}),
 }
 
+# probes and static files never need a user, skip the backend entirely
+UNAUTHENTICATED_PATHS = PROBE_PATHS
+UNAUTHENTICATED_PREFIXES = (STATIC_PREFIX,)
+
+PBKDF2_ITERATIONS = 200_000
+
+
+def hash_password(password: str, salt: Optional[bytes] = None) -> str:
+    """Hash a password as `pbkdf2_sha256$<iterations>$<salt>$<hash>`."""
+    salt = salt or os.urandom(16)
+    digest = hashlib.pbkdf2_hmac(
+        "sha256", password.encode("utf-8"), salt, PBKDF2_ITERATIONS
+    )
+    return f"pbkdf2_sha256${PBKDF2_ITERATIONS}${salt.hex()}${digest.hex()}"
+
+
+def verify_password(password: str, encoded: str) -> bool:
+    algorithm, iterations, salt, expected = encoded.split("$")
+    if algorithm != "pbkdf2_sha256":
+        return False
+    digest = hashlib.pbkdf2_hmac(
+        "sha256", password.encode("utf-8"), bytes.fromhex(salt), int(iterations)
+    )
+    return hmac.compare_digest(digest, bytes.fromhex(expected))
+
+
+class FrozenAuthCredentials(AuthCredentials):
+    """AuthCredentials whose scopes are a frozenset for O(1) scope checks."""
+
+    def __init__(self, scopes: Iterable[str] = ()):
+        self.scopes = frozenset(scopes)
+
+
+class CredentialStore:
+    """Looks up password hashes and scopes, subclass to back it with a database."""
+
+    def get(self, username: str) -> Optional[Tuple[str, FrozenSet[str]]]:
+        raise NotImplementedError
+
+    def verify(self, username: str, password: str) -> Optional[FrozenSet[str]]:
+        """Return the user's scopes if the password matches, else None."""
+        record = self.get(username)
+        if record is None:
+            # hash anyway so unknown users take as long as wrong passwords
+            verify_password(password, _DUMMY_HASH)
+            return None
+        password_hash, scopes = record
+        if not verify_password(password, password_hash):
+            return None
+        return scopes
+
+
+class InMemoryCredentialStore(CredentialStore):
+    """Credential store over a username -> password hash mapping."""
+
+    def __init__(
+        self,
+        users: Dict[str, str],
+        scopes: Dict[str, FrozenSet[str]],
+    ):
+        self.users = {
+            username: (password_hash, frozenset(scopes.get(username, ())))
+            for username, password_hash in users.items()
+        }
+
+    def get(self, username: str) -> Optional[Tuple[str, FrozenSet[str]]]:
+        return self.users.get(username)
+
+
+# hash of the empty password, checked for unknown usernames
+_DUMMY_HASH = (
+    "pbkdf2_sha256$200000$a30aeafc65a6c5123ed21ae5f6c04814$"
+    "4515acc09550cac38b4c92eead8def8252bf9412210351a8dde9f2d7695b8e3a"
+)
+
 
 def authenticated(func: callable):
     @wraps(func)
@@ -38,7 +131,7 @@ def admin(func: callable):
     async def wrapper(request: Request, *args, **kwargs):
         if not request.user.is_authenticated:
             raise HTTPException(status_code=401, detail="Authentication required")
-        if "admin" not in request.user.scopes:
+        if "admin" not in request.auth.scopes:
             raise HTTPException(status_code=403, detail="Admin access required")
         return await func(request, *args, **kwargs)
 
@@ -61,9 +154,42 @@ def has_scope(scope: str):
 
 
 class BasicAuthBackend(AuthenticationBackend):
-    """Custom authentication backend that validates Basic auth credentials."""
+    """Custom authentication backend that validates Basic auth credentials.
+
+    Verified Authorization headers are remembered by digest for
+    `AUTH_CACHE_TTL` seconds, so the password hash only runs once per
+    credential per TTL instead of on every request. Rejected headers go to
+    a smaller cache of their own so random credentials cannot push valid
+    logins out. The hash runs in a thread and never blocks the event loop.
+    """
+
+    def __init__(
+        self,
+        store: Optional[CredentialStore] = None,
+        cache_ttl: Optional[float] = None,
+        cache_size: Optional[int] = None,
+        failure_cache_size: Optional[int] = None,
+    ):
+        self.store = store or InMemoryCredentialStore(AUTH_DB, USER_SCOPES)
+        ttl = settings.AUTH_CACHE_TTL if cache_ttl is None else cache_ttl
+        self.cache = LRUCache(
+            maxsize=settings.AUTH_CACHE_SIZE if cache_size is None else cache_size,
+            ttl=ttl,
+        )
+        self.failures = LRUCache(
+            maxsize=(
+                settings.AUTH_FAILURE_CACHE_SIZE
+                if failure_cache_size is None
+                else failure_cache_size
+            ),
+            ttl=ttl,
+        )
 
     async def authenticate(self, request: Request):
+        path = request.url.path
+        if path in UNAUTHENTICATED_PATHS or path.startswith(UNAUTHENTICATED_PREFIXES):
+            return None
+
         # Extract the 'Authorization' header from the request
         auth_header = request.headers.get("Authorization")
 
@@ -73,19 +199,42 @@ class BasicAuthBackend(AuthenticationBackend):
         try:
             # Basic authentication: "Basic <username>:<password>"
             auth_type, credentials = auth_header.split(" ", 1)
-            if auth_type != "Basic":
-                return None  # Unsupported auth type
+        except ValueError as e:
+            raise HTTPException(
+                status_code=400, detail="Invalid Authorization format"
+            ) from e
+        if auth_type != "Basic":
+            # Unsupported auth type, checked before the caches so other
+            # schemes cannot fill them
+            return None
+
+        key = hashlib.sha256(auth_header.encode("utf-8")).digest()
+        if key in self.failures:
+            raise HTTPException(status_code=401, detail="Invalid credentials")
+        result = self.cache.get(key)
+        if result is None:
+            result = await asyncio.to_thread(self._verify, credentials)
+            if result is False:
+                self.failures.set(key, result)
+                raise HTTPException(status_code=401, detail="Invalid credentials")
+            self.cache.set(key, result)
+        return result
 
+    def _verify(self, credentials: str):
+        try:
             username, password = credentials.split(":")
-        except ValueError:
-            raise HTTPException(status_code=400, detail="Invalid Authorization format")
+        except ValueError as e:
+            raise HTTPException(
+                status_code=400, detail="Invalid Authorization format"
+            ) from e
 
-        # Validate credentials against the in-memory AUTH_DB
-        if AUTH_DB.get(username) != password:
-            raise HTTPException(status_code=401, detail="Invalid credentials")
+        # Validate credentials against the credential store
+        scopes = self.store.verify(username, password)
+        if scopes is None:
+            return False
 
         # If valid, return user object and auth credentials
-        return AuthCredentials(USER_SCOPES[username]), SimpleUser(username)
+        return FrozenAuthCredentials(scopes), SimpleUser(username)
 
 
 # # Initialize FastAPI app
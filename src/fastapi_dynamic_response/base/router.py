@@ -1,13 +1,21 @@
-from fastapi import APIRouter, Depends, Request
+import asyncio
+from datetime import datetime, timezone
+
+from fastapi import APIRouter, Depends, Request, WebSocket
 
 from fastapi_dynamic_response.auth import admin, authenticated, has_scope
 from fastapi_dynamic_response.base.schema import Message
 from fastapi_dynamic_response.dependencies import get_content_type
+from fastapi_dynamic_response.fastpath import uses_session
+from fastapi_dynamic_response.projection import projected
+from fastapi_dynamic_response.push import push_hub
+from fastapi_dynamic_response.serialization import DynamicJSONRoute
 
-router = APIRouter()
+router = APIRouter(route_class=DynamicJSONRoute)
 
 
 @router.get("/example")
+@projected(list_key="data")
 async def get_example(
     request: Request,
     content_type: str = Depends(get_content_type),
@@ -16,6 +24,37 @@ async def get_example(
     return {"message": "Hello, this is an example", "data": [1, 2, 3, 4]}
 
 
+@push_hub.source("example", template_name="example.html")
+async def example_updates():
+    tick = 0
+    while True:
+        now = datetime.now(timezone.utc).replace(microsecond=0)
+        yield {"message": f"Updated at {now.isoformat()}", "data": [1, 2, 3, tick]}
+        tick += 1
+        await asyncio.sleep(1)
+
+
+@router.get("/example/stream")
+async def example_stream(request: Request):
+    return push_hub.sse(request, "example")
+
+
+@router.websocket("/example/ws")
+async def example_ws(websocket: WebSocket):
+    await push_hub.websocket(websocket, "example")
+
+
+@router.get("/visits")
+@uses_session
+async def get_visits(request: Request):
+    request.state.template_name = "example.html"
+    request.session["visits"] = request.session.get("visits", 0) + 1
+    return {
+        "message": f"You have visited {request.session['visits']} times",
+        "data": [],
+    }
+
+
 @router.get("/private")
 @authenticated
 async def get_private(
@@ -57,6 +96,7 @@ async def get_error(
 
 
 @router.get("/another-example")
+@projected(list_key="items")
 async def another_example(
     request: Request,
     content_type: str = Depends(get_content_type),
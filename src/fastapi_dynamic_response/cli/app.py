@@ -1,6 +1,14 @@
+import os
+import subprocess
+import sys
+import time
+
+from rich.console import Console
+from rich.table import Table
 import typer
 import uvicorn
 
+from fastapi_dynamic_response.server import run_preforked
 from fastapi_dynamic_response.settings import settings
 
 
@@ -19,7 +27,77 @@ def run(
         help="the environment to use",
     ),
 ):
-    uvicorn.run(**settings.api_server.dict())
+    api_server = settings.api_server
+    if api_server.reload and settings.ENV != "local":
+        message = f"reload=True is only allowed when ENV is local, not {settings.ENV}"
+        raise typer.BadParameter(message)
+    if api_server.preload:
+        if api_server.reload:
+            message = "preload cannot be combined with reload"
+            raise typer.BadParameter(message)
+        run_preforked(api_server)
+    else:
+        uvicorn.run(**api_server.uvicorn_kwargs())
+
+
+def parse_importtime(stderr: str) -> list:
+    """Parse `python -X importtime` output into (module, self_us, cumulative_us)."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:") :].split("|")
+        rows.append((module.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+@app_app.command("startup-profile")
+def startup_profile(
+    *,
+    module: str = typer.Option(
+        "fastapi_dynamic_response.main",
+        help="the module to import",
+    ),
+    top: int = typer.Option(25, help="number of modules to show"),
+    prefix: str = typer.Option(
+        "",
+        help="only show modules starting with this prefix",
+    ),
+    fast_startup: bool = typer.Option(
+        default=False,
+        help="profile with FAST_STARTUP enabled",
+    ),
+):
+    """Report import time per module for a cold start of the app."""
+    env = dict(os.environ)
+    if fast_startup:
+        env["FAST_STARTUP"] = "true"
+    start = time.perf_counter()
+    result = subprocess.run(  # noqa: S603 - our own interpreter
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    wall = time.perf_counter() - start
+    console = Console()
+    if result.returncode != 0:
+        console.print(result.stderr.splitlines()[-1] if result.stderr else "")
+        raise typer.Exit(result.returncode)
+
+    rows = parse_importtime(result.stderr)
+    total = next((row[2] for row in rows if row[0] == module), 0)
+    rows = [row for row in rows if row[0].startswith(prefix)]
+    rows.sort(key=lambda row: row[2], reverse=True)
+
+    table = Table(title=f"import {module}: {total / 1e6:.3f}s, process {wall:.3f}s")
+    table.add_column("module")
+    table.add_column("self ms", justify="right")
+    table.add_column("cumulative ms", justify="right")
+    for name, self_us, cumulative_us in rows[:top]:
+        table.add_row(name, f"{self_us / 1e3:.1f}", f"{cumulative_us / 1e3:.1f}")
+    console.print(table)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,222 @@
+import asyncio
+import json
+import os
+import secrets
+import time
+from pathlib import Path
+from typing import List
+from typing import Optional
+
+import typer
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from rich.console import Console
+from rich.table import Table
+
+from fastapi_dynamic_response.serialization import encode_cbor
+from fastapi_dynamic_response.serialization import encode_msgpack
+from fastapi_dynamic_response.serialization import get_engine
+from fastapi_dynamic_response.settings import available_cpus
+
+bench_app = typer.Typer()
+console = Console()
+
+
+@bench_app.callback()
+def bench():
+    "benchmark cli"
+
+
+def _time(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+@bench_app.command("json")
+def json_engines(
+    size: int = typer.Option(100_000, help="number of items in the data array"),
+    repeat: int = typer.Option(10, help="runs per engine, the best is reported"),
+):
+    """Compare JSON engines on an /example style payload with a large data array."""
+    payload = {
+        "message": "Hello, this is an example",
+        "data": [
+            {"id": i, "value": i * 1.5, "name": f"item-{i}", "ok": i % 2 == 0}
+            for i in range(size)
+        ],
+    }
+
+    def current_path():
+        # route output -> JSONResponse, then the middleware parses the body
+        # and renders it again with JSONResponse
+        body = JSONResponse(jsonable_encoder(payload)).body
+        return JSONResponse(json.loads(body)).body
+
+    results = [("current (json + JSONResponse)", _time(current_path, repeat))]
+
+    for name in ("json", "orjson", "msgspec"):
+        try:
+            dumps, loads = get_engine(name)
+        except ImportError:
+            console.print(f"[yellow]{name} is not installed, skipping[/yellow]")
+            continue
+
+        def json_path(dumps=dumps):
+            # DynamicJSONRoute output, passed through the middleware as is
+            dumps(payload)
+
+        def render_path(dumps=dumps, loads=loads):
+            # other formats still parse the route output in the middleware
+            loads(dumps(payload))
+
+        results.append((f"{name} JSON response", _time(json_path, repeat)))
+        results.append((f"{name} parse for rendering", _time(render_path, repeat)))
+
+    baseline = results[0][1]
+    table = Table(title=f"JSON engines, {size} items, best of {repeat}")
+    table.add_column("path")
+    table.add_column("seconds", justify="right")
+    table.add_column("speedup", justify="right")
+    for name, seconds in results:
+        table.add_row(name, f"{seconds:.4f}", f"{baseline / seconds:.2f}x")
+    console.print(table)
+
+
+@bench_app.command("binary")
+def binary_formats(
+    size: int = typer.Option(100_000, help="number of items in the data array"),
+    repeat: int = typer.Option(10, help="runs per format, the best is reported"),
+):
+    """Compare payload size and encode/decode cost of JSON, msgpack and CBOR."""
+    payload = {
+        "message": "Hello, this is an example",
+        "data": [i * 1.5 if i % 2 else i for i in range(size)],
+    }
+    formats = [("json", *get_engine("json"))]
+    try:
+        import msgpack  # noqa: PLC0415 - optional, from the binary extra
+
+        formats.append(("msgpack", encode_msgpack, msgpack.unpackb))
+    except ImportError:
+        console.print("[yellow]msgpack is not installed, skipping[/yellow]")
+    try:
+        import cbor2  # noqa: PLC0415 - optional, from the binary extra
+
+        formats.append(("cbor", encode_cbor, cbor2.loads))
+    except ImportError:
+        console.print("[yellow]cbor2 is not installed, skipping[/yellow]")
+
+    table = Table(title=f"Output formats, {size} numbers, best of {repeat}")
+    table.add_column("format")
+    table.add_column("bytes", justify="right")
+    table.add_column("encode seconds", justify="right")
+    table.add_column("decode seconds", justify="right")
+    for name, encode, decode in formats:
+        body = encode(payload)
+        table.add_row(
+            name,
+            f"{len(body):,}",
+            f"{_time(lambda encode=encode: encode(payload), repeat):.4f}",
+            f"{_time(lambda decode=decode, body=body: decode(body), repeat):.4f}",
+        )
+    console.print(table)
+
+
+@bench_app.command("load")
+def load(  # noqa: PLR0913 - one parameter per command line option
+    *,
+    workers: List[int] = typer.Option(
+        [1, 2, 4], "--workers", "-w", help="worker counts to sweep, repeatable"
+    ),
+    concurrency: int = typer.Option(64, help="concurrent client connections"),
+    duration: float = typer.Option(20.0, help="seconds of load per worker count"),
+    warmup: float = typer.Option(3.0, help="seconds of unmeasured load first"),
+    mix: Optional[Path] = typer.Option(
+        None,
+        help="json list of scenarios (name, weight, path, method, headers) "
+        "replacing the default traffic mix",
+    ),
+    app: str = typer.Option(
+        "fastapi_dynamic_response.main:app", help="the app uvicorn serves"
+    ),
+    port: int = typer.Option(8765, help="port the server is started on"),
+    env: str = typer.Option("prod", help="ENV of the started server"),
+    seed: int = typer.Option(0, help="seed for the scenario choice"),
+    output: Path = typer.Option(
+        Path("bench-load"), help="report prefix, writes .json and .md"
+    ),
+):
+    """Sweep uvicorn worker counts under a realistic traffic mix.
+
+    Each worker count gets a freshly started server on localhost, the load
+    comes from a single asyncio client process, so keep an eye on its CPU
+    when sweeping past a few workers.
+    """
+    try:
+        # imports httpx, which comes with the bench extra
+        from fastapi_dynamic_response.cli import load as load_test  # noqa: PLC0415
+    except ModuleNotFoundError as e:
+        if e.name != "httpx":
+            raise
+        message = "bench load needs httpx, install the bench extra"
+        raise typer.BadParameter(message) from e
+
+    scenarios = load_test.load_mix(mix)
+    plan = load_test.LoadPlan(
+        app=app,
+        port=port,
+        mix=scenarios,
+        concurrency=concurrency,
+        duration=duration,
+        warmup=warmup,
+        seed=seed,
+        env={
+            "ENV": env,
+            # every worker of a server has to sign sessions with the same key
+            "SESSION_SECRET_KEY": os.environ.get("SESSION_SECRET_KEY")
+            or secrets.token_hex(32),
+        },
+    )
+    levels = []
+    for worker_count in workers:
+        console.print(f"[bold]{worker_count} workers[/bold]")
+        levels.append(asyncio.run(load_test.run_level(plan, worker_count)))
+
+    report = {
+        "app": app,
+        "concurrency": concurrency,
+        "duration": duration,
+        "cpus": available_cpus(),
+        "mix": [scenario.model_dump() for scenario in scenarios],
+        "levels": levels,
+    }
+    output.with_suffix(".json").write_text(json.dumps(report, indent=2))
+    output.with_suffix(".md").write_text(load_test.to_markdown(report))
+
+    table = Table(title=f"Load, {concurrency} connections, {duration}s per level")
+    table.add_column("workers", justify="right")
+    table.add_column("rps", justify="right")
+    table.add_column("p50 ms", justify="right")
+    table.add_column("p95 ms", justify="right")
+    table.add_column("p99 ms", justify="right")
+    table.add_column("errors", justify="right")
+    table.add_column("rss MB / worker", justify="right")
+    for level in levels:
+        rss = level["rss_mb_per_worker"]
+        table.add_row(
+            str(level["workers"]),
+            f"{level['throughput_rps']:,}",
+            str(level["p50_ms"]),
+            str(level["p95_ms"]),
+            str(level["p99_ms"]),
+            str(level["errors"]),
+            f"{sum(rss) / len(rss):.1f}",
+        )
+    console.print(table)
+    console.print(
+        f"wrote {output.with_suffix('.json')} and {output.with_suffix('.md')}"
+    )
@@ -1,7 +1,9 @@
 import typer
 
 from fastapi_dynamic_response.cli.app import app_app
+from fastapi_dynamic_response.cli.bench import bench_app
 
 app = typer.Typer()
 
 app.add_typer(app_app, name="app")
+app.add_typer(bench_app, name="bench")
@@ -0,0 +1,382 @@
+import asyncio
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict
+from typing import List
+from typing import Optional
+
+import httpx
+from pydantic import BaseModel
+
+BROWSER_UA = (
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/130.0 Safari/537.36"
+)
+
+
+class Scenario(BaseModel):
+    """One kind of request in the traffic mix, picked with probability `weight`."""
+
+    name: str
+    weight: float
+    path: str
+    method: str = "GET"
+    headers: Dict[str, str] = {}
+
+
+# roughly what we see in production: API clients and browsers, terminals
+# hitting the rtf path, htmx swaps, probes, scanners and logged in users
+DEFAULT_MIX = [
+    Scenario(
+        name="json api",
+        weight=30,
+        path="/example",
+        headers={"accept": "application/json", "user-agent": "python-requests/2.32"},
+    ),
+    Scenario(
+        name="browser html",
+        weight=20,
+        path="/example",
+        headers={"user-agent": BROWSER_UA},
+    ),
+    Scenario(
+        name="htmx partial",
+        weight=15,
+        path="/another-example",
+        headers={"user-agent": BROWSER_UA, "hx-request": "true"},
+    ),
+    Scenario(
+        name="curl rtf",
+        weight=8,
+        path="/another-example",
+        headers={"user-agent": "curl/8.5.0"},
+    ),
+    Scenario(
+        name="httpie rtf",
+        weight=4,
+        path="/example",
+        headers={"user-agent": "HTTPie/3.2.2"},
+    ),
+    Scenario(
+        name="markdown",
+        weight=5,
+        path="/example",
+        headers={"accept": "text/markdown"},
+    ),
+    Scenario(
+        name="not found",
+        weight=5,
+        path="/does-not-exist",
+        headers={"user-agent": BROWSER_UA},
+    ),
+    Scenario(
+        name="authenticated",
+        weight=5,
+        path="/private",
+        headers={
+            "accept": "application/json",
+            "authorization": "Basic user1:password123",
+        },
+    ),
+    Scenario(name="probe", weight=8, path="/livez", headers={}),
+]
+
+
+class LoadPlan(BaseModel):
+    """The server and traffic `run_level` uses for every worker count."""
+
+    app: str
+    port: int
+    mix: List[Scenario]
+    concurrency: int
+    duration: float
+    warmup: float
+    seed: int
+    env: Dict[str, str] = {}
+
+
+def load_mix(path: Optional[Path]) -> List[Scenario]:
+    if path is None:
+        return DEFAULT_MIX
+    return [Scenario(**scenario) for scenario in json.loads(path.read_text())]
+
+
+def percentile(ordered: List[float], percent: float) -> float:
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def latency_summary(latencies: List[float]) -> dict:
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "p50_ms": round(percentile(ordered, 50) * 1000, 2),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 2),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2) if ordered else 0.0,
+    }
+
+
+def rss_bytes(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def worker_pids(server_pid: int) -> List[int]:
+    """The processes serving requests, uvicorn's spawned workers or the server."""
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as stat:
+                # the command name can hold spaces, the ppid follows its ")"
+                ppid = int(stat.read().rsplit(")", 1)[1].split()[1])
+            if ppid != server_pid:
+                continue
+            with open(f"/proc/{entry}/cmdline", "rb") as cmdline:
+                if b"spawn_main" in cmdline.read():
+                    children.append(int(entry))
+        except (OSError, IndexError, ValueError):
+            continue
+    return sorted(children) or [server_pid]
+
+
+def start_server(
+    app: str, port: int, workers: int, env: Dict[str, str], log
+) -> subprocess.Popen:
+    command = [
+        sys.executable,
+        "-m",
+        "uvicorn",
+        app,
+        "--host",
+        "127.0.0.1",
+        "--port",
+        str(port),
+        "--workers",
+        str(workers),
+        "--log-level",
+        "warning",
+        "--no-access-log",
+    ]
+    # `log` is a file rather than a pipe, a chatty server must not block on
+    # a full pipe
+    return subprocess.Popen(  # noqa: S603 - our own interpreter and arguments
+        command,
+        env={**os.environ, **env},
+        stdout=subprocess.DEVNULL,
+        stderr=log,
+        start_new_session=True,
+    )
+
+
+def stop_server(server: subprocess.Popen) -> None:
+    if server.poll() is None:
+        os.killpg(server.pid, signal.SIGTERM)
+        try:
+            server.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            os.killpg(server.pid, signal.SIGKILL)
+            server.wait()
+
+
+async def wait_ready(
+    client: httpx.AsyncClient,
+    base_url: str,
+    server: subprocess.Popen,
+    log,
+    timeout: float,
+):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            message = (
+                f"server exited with {server.returncode} before it was ready\n"
+                f"{log_tail(log)}"
+            )
+            raise RuntimeError(message)
+        try:
+            response = await client.get(f"{base_url}/readyz")
+        except httpx.TransportError:
+            # not listening yet
+            response = None
+        if response is not None and response.is_success:
+            return
+        await asyncio.sleep(0.2)
+    message = f"server was not ready after {timeout}s"
+    raise RuntimeError(message)
+
+
+def log_tail(log, limit: int = 4000) -> str:
+    log.seek(0)
+    return log.read().decode(errors="replace")[-limit:]
+
+
+async def generate_load(
+    client: httpx.AsyncClient,
+    base_url: str,
+    plan: LoadPlan,
+    duration: float,
+    seed: int,
+) -> dict:
+    """Replay the plan's mix from its connections for `duration` seconds."""
+    mix = plan.mix
+    # seeded so runs replay the same scenario sequence, not for security
+    rng = random.Random(seed)  # noqa: S311
+    weights = [scenario.weight for scenario in mix]
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    statuses: Dict[str, Counter] = defaultdict(Counter)
+    deadline = time.perf_counter() + duration
+
+    async def user():
+        while time.perf_counter() < deadline:
+            scenario = rng.choices(mix, weights)[0]
+            start = time.perf_counter()
+            try:
+                response = await client.request(
+                    scenario.method,
+                    base_url + scenario.path,
+                    headers=scenario.headers,
+                )
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                # counted as an error
+                status = type(e).__name__
+            latencies[scenario.name].append(time.perf_counter() - start)
+            statuses[scenario.name][status] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(plan.concurrency)))
+    elapsed = time.perf_counter() - start
+    return {"elapsed": elapsed, "latencies": latencies, "statuses": statuses}
+
+
+async def sample_rss(server_pid: int, peaks: Dict[int, int], interval: float = 0.5):
+    while True:
+        for pid in worker_pids(server_pid):
+            peaks[pid] = max(peaks.get(pid, 0), rss_bytes(pid))
+        await asyncio.sleep(interval)
+
+
+async def run_level(plan: LoadPlan, workers: int) -> dict:
+    """Start a server with `workers` workers, load it and measure it."""
+    base_url = f"http://127.0.0.1:{plan.port}"
+    limits = httpx.Limits(
+        max_connections=plan.concurrency,
+        max_keepalive_connections=plan.concurrency,
+    )
+    with tempfile.TemporaryFile() as log:
+        server = start_server(plan.app, plan.port, workers, plan.env, log)
+        try:
+            async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+                await wait_ready(client, base_url, server, log, timeout=60)
+                if plan.warmup:
+                    await generate_load(client, base_url, plan, plan.warmup, plan.seed)
+
+                peaks: Dict[int, int] = {}
+                sampler = asyncio.create_task(sample_rss(server.pid, peaks))
+                try:
+                    result = await generate_load(
+                        client, base_url, plan, plan.duration, plan.seed + 1
+                    )
+                finally:
+                    sampler.cancel()
+                pids = worker_pids(server.pid)
+                rss = {pid: rss_bytes(pid) for pid in pids}
+        finally:
+            stop_server(server)
+
+    all_latencies = [
+        latency for latencies in result["latencies"].values() for latency in latencies
+    ]
+    statuses = sum(result["statuses"].values(), Counter())
+    errors = sum(
+        count
+        for status, count in statuses.items()
+        if not status.isdigit() or status.startswith("5")
+    )
+    return {
+        "workers": workers,
+        "concurrency": plan.concurrency,
+        "duration": round(result["elapsed"], 3),
+        "throughput_rps": round(len(all_latencies) / result["elapsed"], 1),
+        "errors": errors,
+        **latency_summary(all_latencies),
+        "statuses": dict(statuses),
+        "rss_mb_per_worker": [round(rss[pid] / 2**20, 1) for pid in pids],
+        "peak_rss_mb_per_worker": [
+            round(peaks.get(pid, rss[pid]) / 2**20, 1) for pid in pids
+        ],
+        "scenarios": {
+            name: {
+                **latency_summary(latencies),
+                "statuses": dict(result["statuses"][name]),
+            }
+            for name, latencies in sorted(result["latencies"].items())
+        },
+    }
+
+
+def to_markdown(report: dict) -> str:
+    lines = [
+        "# Load test",
+        "",
+        f"app `{report['app']}`, {report['concurrency']} connections, "
+        f"{report['duration']}s per level, cpus {report['cpus']}",
+        "",
+        "| workers | rps | p50 ms | p95 ms | p99 ms | max ms | errors "
+        "| rss MB / worker | peak rss MB / worker |",
+        "|---:|---:|---:|---:|---:|---:|---:|---:|---:|",
+    ]
+    for level in report["levels"]:
+        rss = level["rss_mb_per_worker"]
+        peak = level["peak_rss_mb_per_worker"]
+        lines.append(
+            f"| {level['workers']} | {level['throughput_rps']} | {level['p50_ms']} "
+            f"| {level['p95_ms']} | {level['p99_ms']} | {level['max_ms']} "
+            f"| {level['errors']} | {sum(rss) / len(rss):.1f} "
+            f"| {max(peak):.1f} |"
+        )
+
+    lines += ["", "## Traffic mix", ""]
+    lines += ["| scenario | weight | path | headers |", "|---|---:|---|---|"]
+    for scenario in report["mix"]:
+        headers = ", ".join(f"{k}: {v}" for k, v in scenario["headers"].items())
+        lines.append(
+            f"| {scenario['name']} | {scenario['weight']} "
+            f"| {scenario['method']} {scenario['path']} | {headers} |"
+        )
+
+    for level in report["levels"]:
+        lines += [
+            "",
+            f"## {level['workers']} workers by scenario",
+            "",
+            "| scenario | requests | p50 ms | p95 ms | p99 ms | statuses |",
+            "|---|---:|---:|---:|---:|---|",
+        ]
+        for name, scenario in level["scenarios"].items():
+            statuses = ", ".join(f"{k}: {v}" for k, v in scenario["statuses"].items())
+            lines.append(
+                f"| {name} | {scenario['requests']} | {scenario['p50_ms']} "
+                f"| {scenario['p95_ms']} | {scenario['p99_ms']} | {statuses} |"
+            )
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,99 @@
+from io import BytesIO
+from typing import Any
+from typing import Iterator
+from typing import List
+from typing import Optional
+
+from fastapi_dynamic_response.serialization import dumps
+
+
+class _ChunkSink:
+    """Write-only file object handing back what was written since the last drain."""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def _tabular_key(content: dict) -> Optional[str]:
+    if isinstance(content.get("data"), list):
+        return "data"
+    for key, value in content.items():
+        if isinstance(value, list):
+            return key
+    return None
+
+
+def _is_record(value: Any) -> bool:
+    return isinstance(value, dict)
+
+
+def to_table(content: Any):
+    """Turn route output into a pyarrow Table.
+
+    A list of records becomes one column per field, a list of scalars
+    becomes a single column. For dicts the `data` list (or the first list
+    value) is the table and the remaining keys are kept as schema metadata.
+    """
+    import pyarrow as pa  # noqa: PLC0415 - optional, from the arrow extra
+
+    metadata = {}
+    name = "value"
+    rows = content
+    if isinstance(content, dict):
+        key = _tabular_key(content)
+        if key is None:
+            rows = [content]
+        else:
+            name = key
+            rows = content[key]
+            metadata = {
+                k: v if isinstance(v, str) else dumps(v)
+                for k, v in content.items()
+                if k != key
+            }
+    elif not isinstance(content, list):
+        rows = [{name: content}]
+
+    if rows and all(_is_record(row) for row in rows):
+        table = pa.Table.from_pylist(rows)
+    else:
+        table = pa.table({name: pa.array(rows)})
+    return table.replace_schema_metadata(metadata or None)
+
+
+def stream_arrow(table, batch_size: int) -> Iterator[bytes]:
+    """Yield an Arrow IPC stream one record batch at a time."""
+    import pyarrow as pa  # noqa: PLC0415 - optional, from the arrow extra
+
+    sink = _ChunkSink()
+    writer = pa.ipc.new_stream(sink, table.schema)
+    yield sink.drain()
+    for batch in table.to_batches(max_chunksize=batch_size):
+        writer.write_batch(batch)
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def to_parquet(table) -> bytes:
+    import pyarrow.parquet as pq  # noqa: PLC0415 - optional, from the arrow extra
+
+    buffer = BytesIO()
+    pq.write_table(table, buffer)
+    return buffer.getvalue()
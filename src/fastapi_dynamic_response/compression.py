@@ -0,0 +1,248 @@
+import gzip
+import hashlib
+import os
+from typing import Dict
+from typing import Optional
+from typing import Tuple
+
+import structlog
+from fastapi import Request
+from fastapi import Response
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse
+from starlette.types import Scope
+
+from fastapi_dynamic_response.cache import LRUCache
+from fastapi_dynamic_response.settings import settings
+
+logger = structlog.get_logger()
+
+# compressed bodies keyed on (body digest, encoding) so repeated renders of
+# the same content are only compressed once per worker
+compressed_cache = LRUCache(maxsize=settings.compression.cache_size)
+
+
+def _brotli():
+    try:
+        import brotli  # noqa: PLC0415 - optional, from the compression extra
+    except ImportError:
+        return None
+    return brotli
+
+
+def _zstd():
+    try:
+        import zstandard  # noqa: PLC0415 - optional, from the compression extra
+    except ImportError:
+        return None
+    return zstandard
+
+
+def available_encodings() -> list:
+    available = []
+    for encoding in settings.compression.encodings:
+        if encoding == "br" and _brotli() is None:
+            continue
+        if encoding == "zstd" and _zstd() is None:
+            continue
+        if encoding in ("br", "zstd", "gzip"):
+            available.append(encoding)
+    return available
+
+
+def parse_accept_encoding(accept_encoding: str) -> Dict[str, float]:
+    """Parse an Accept-Encoding header into a mapping of coding to q-value."""
+    qualities = {}
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[coding.strip()] = quality
+    return qualities
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick the first server-preferred encoding the client accepts."""
+    if not accept_encoding:
+        return None
+    qualities = parse_accept_encoding(accept_encoding)
+    wildcard = qualities.get("*", 0.0)
+    candidates = [
+        encoding
+        for encoding in available_encodings()
+        if qualities.get(encoding, wildcard) > 0
+    ]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda encoding: qualities.get(encoding, wildcard))
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "gzip":
+        return gzip.compress(
+            body, compresslevel=settings.compression.gzip_level, mtime=0
+        )
+    if encoding == "br":
+        return _brotli().compress(body, quality=settings.compression.brotli_quality)
+    if encoding == "zstd":
+        compressor = _zstd().ZstdCompressor(level=settings.compression.zstd_level)
+        return compressor.compress(body)
+    message = f"Unsupported encoding {encoding}"
+    raise ValueError(message)
+
+
+def get_compressed(body: bytes, encoding: str) -> bytes:
+    key = (hashlib.blake2b(body, digest_size=16).digest(), encoding)
+    compressed = compressed_cache.get(key)
+    if compressed is None:
+        compressed = compress(body, encoding)
+        compressed_cache.set(key, compressed)
+    return compressed
+
+
+def is_compressible(media_type: Optional[str]) -> bool:
+    if not media_type:
+        return False
+    media_type = media_type.split(";")[0].strip().lower()
+    return media_type in settings.compression.content_types
+
+
+def add_vary(response: Response, header: str = "Accept-Encoding"):
+    vary = response.headers.get("vary")
+    if not vary:
+        response.headers["vary"] = header
+    elif header.lower() not in vary.lower():
+        response.headers["vary"] = f"{vary}, {header}"
+
+
+def compress_response(request: Request, response: Response) -> Response:
+    """Compress a rendered response in place based on Accept-Encoding."""
+    body = getattr(response, "body", None)
+    if (
+        not settings.compression.enabled
+        or not body
+        or "content-encoding" in response.headers
+        or not is_compressible(response.headers.get("content-type"))
+    ):
+        return response
+
+    add_vary(response)
+    if len(body) < settings.compression.minimum_size:
+        return response
+
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    if encoding is None:
+        return response
+
+    compressed = get_compressed(body, encoding)
+    if len(compressed) >= len(body):
+        return response
+
+    response.body = compressed
+    response.headers["content-encoding"] = encoding
+    response.headers["content-length"] = str(len(compressed))
+    request.state.bound_logger.info(
+        "compressed response",
+        encoding=encoding,
+        original_size=len(body),
+        compressed_size=len(compressed),
+    )
+    return response
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles that serves precompressed variants with immutable caching.
+
+    Variants are built in memory (the root filesystem is read only in k8s)
+    the first time a file is served, or up front with `precompress`.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.variants: Dict[Tuple[str, float, int], Dict[str, bytes]] = {}
+
+    def _variants(self, full_path: str, stat_result: os.stat_result):
+        key = (full_path, stat_result.st_mtime, stat_result.st_size)
+        variants = self.variants.get(key)
+        if variants is None:
+            with open(full_path, "rb") as f:
+                body = f.read()
+            variants = {
+                encoding: compress(body, encoding) for encoding in available_encodings()
+            }
+            self.variants = {
+                k: v for k, v in self.variants.items() if k[0] != full_path
+            }
+            self.variants[key] = variants
+        return variants
+
+    def precompress(self):
+        if self.directory is None or not os.path.isdir(self.directory):
+            return
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                full_path = os.path.join(root, name)
+                media_type = FileResponse(full_path).media_type
+                if is_compressible(media_type):
+                    self._variants(full_path, os.stat(full_path))
+        logger.info("precompressed static files", files=len(self.variants))
+
+    def version(self, path: str) -> str:
+        """Short content hash used to bust the immutable cache on deploys."""
+        full_path, stat_result = self.lookup_path(path)
+        if stat_result is None:
+            return "0"
+        with open(full_path, "rb") as f:
+            return hashlib.blake2b(f.read(), digest_size=6).hexdigest()
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        response = await super().get_response(path, scope)
+        if response.status_code not in (200, 304):
+            return response
+        response.headers["cache-control"] = (
+            f"public, max-age={settings.compression.static_max_age}, immutable"
+        )
+        if (
+            not settings.compression.enabled
+            or not isinstance(response, FileResponse)
+            or not is_compressible(response.media_type)
+        ):
+            return response
+
+        add_vary(response)
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            return response
+
+        variants = self._variants(response.path, response.stat_result)
+        body = variants.get(encoding)
+        if body is None:
+            return response
+
+        headers = {
+            key: value
+            for key, value in response.headers.items()
+            if key != "content-length"
+        }
+        headers["content-encoding"] = encoding
+        etag = headers.get("etag")
+        if etag:
+            # each encoding is a distinct representation and needs its own etag
+            headers["etag"] = etag.rstrip('"') + f'-{encoding}"'
+        # StaticFiles only compared If-None-Match with the identity etag
+        if self.is_not_modified(Headers(headers), Headers(scope=scope)):
+            return NotModifiedResponse(Headers(headers))
+        return Response(
+            content=body,
+            headers=headers,
+            media_type=response.media_type,
+        )
@@ -1,18 +1,41 @@
+# kubernetes probe endpoints served by zpages
+PROBE_PATHS = frozenset({"/livez", "/readyz", "/healthz"})
+STATIC_PREFIX = "/static/"
+DEBUG_PREFIX = "/debug/"
+
 ACCEPT_TYPES = {
+    "application/arrow": "arrow",
+    "application/cbor": "cbor",
     "application/html": "html",
     "application/html-partial": "html",
     "application/json": "JSON",
     "application/markdown": "markdown",
     "application/md": "markdown",
+    "application/msgpack": "msgpack",
+    "application/parquet": "parquet",
     "application/pdf": "pdf",
     "application/plain": "text",
     "application/rtf": "rtf",
     "application/text": "text",
+    "application/vnd.apache.arrow.stream": "arrow",
+    "application/vnd.apache.parquet": "parquet",
+    "application/vnd.msgpack": "msgpack",
+    "application/x-msgpack": "msgpack",
+    "arrow": "arrow",
+    "cbor": "cbor",
+    "avif": "png",
     "html": "html",
+    "image/avif": "png",
+    "image/jpeg": "png",
     "image/png": "png",
+    "image/webp": "png",
+    "jpeg": "png",
+    "jpg": "png",
     "json": "JSON",
     "markdown": "markdown",
     "md": "markdown",
+    "msgpack": "msgpack",
+    "parquet": "parquet",
     "pdf": "pdf",
     "plain": "text",
     "png": "png",
@@ -29,4 +52,5 @@ ACCEPT_TYPES = {
     "text/rich": "rtf",
     "text/rtf": "rtf",
     "text/x-markdown": "markdown",
+    "webp": "png",
 }
@@ -7,3 +7,13 @@ def get_content_type(
     ),
 ):
     return content_type
+
+
+def get_projection(
+    fields: str = Query(
+        None, description="Comma separated fields to return, e.g. message,data"
+    ),
+    limit: int = Query(None, ge=1, description="Maximum number of items per page"),
+    cursor: str = Query(None, description="Opaque cursor from next_cursor"),
+):
+    return {"fields": fields, "limit": limit, "cursor": cursor}
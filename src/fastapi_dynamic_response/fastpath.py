@@ -0,0 +1,123 @@
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+
+from starlette.middleware.exceptions import ExceptionMiddleware
+from starlette.middleware.sessions import SessionMiddleware
+from starlette.routing import BaseRoute
+from starlette.routing import Match
+from starlette.routing import Mount
+from starlette.types import ASGIApp
+from starlette.types import Receive
+from starlette.types import Scope
+from starlette.types import Send
+
+from fastapi_dynamic_response.constant import PROBE_PATHS
+from fastapi_dynamic_response.constant import STATIC_PREFIX
+
+PROBE = "probe"
+STATIC = "static"
+SESSION = "session"
+STATELESS = "stateless"
+
+
+def uses_session(func: Callable):
+    """Mark a route as reading or writing `request.session`.
+
+    SessionMiddleware only runs for marked routes, everything else skips
+    the cookie parsing and re-signing.
+    """
+    func.uses_session = True
+    return func
+
+
+def classify_route(route: BaseRoute) -> str:
+    path = getattr(route, "path", "")
+    if isinstance(route, Mount) and f"{path}/" == STATIC_PREFIX:
+        return STATIC
+    if path in PROBE_PATHS:
+        return PROBE
+    if getattr(getattr(route, "endpoint", None), "uses_session", False):
+        return SESSION
+    return STATELESS
+
+
+class RouteClassifier:
+    """Sorts the app's routes into probe, static, session and stateless.
+
+    Built once the routes are registered (`classify` runs from preload) so
+    the per-request checks are a set lookup, a prefix test and a regex
+    match against the few session routes.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.kinds: Optional[Dict[str, str]] = None
+        self.session_routes: List[BaseRoute] = []
+
+    def classify(self) -> Dict[str, str]:
+        kinds = {}
+        session_routes = []
+        for route in self.app.router.routes:
+            kind = classify_route(route)
+            kinds[getattr(route, "path", "")] = kind
+            if kind == SESSION:
+                session_routes.append(route)
+        self.session_routes = session_routes
+        self.kinds = kinds
+        return kinds
+
+    def is_fast(self, path: str) -> bool:
+        if self.kinds is None:
+            self.classify()
+        return path.startswith(STATIC_PREFIX) or self.kinds.get(path) == PROBE
+
+    def uses_session(self, scope: Scope) -> bool:
+        if self.kinds is None:
+            self.classify()
+        return any(
+            route.matches(scope)[0] == Match.FULL for route in self.session_routes
+        )
+
+
+class FastPathMiddleware:
+    """Outermost middleware sending probes and static files straight to the router.
+
+    They skip sessions, authentication and the prefers, span, logging and
+    dynamic response middleware. HTTPExceptions (a 503 from /readyz) are
+    still turned into responses by the app's exception handlers.
+    """
+
+    def __init__(self, app: ASGIApp, classifier: RouteClassifier):
+        self.app = app
+        self.classifier = classifier
+        self.fast_app = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and self.classifier.is_fast(scope["path"]):
+            if self.fast_app is None:
+                fastapi_app = self.classifier.app
+                self.fast_app = ExceptionMiddleware(
+                    fastapi_app.router, handlers=fastapi_app.exception_handlers
+                )
+            await self.fast_app(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+
+class SessionRoutesMiddleware:
+    """Run SessionMiddleware only for routes marked with `uses_session`."""
+
+    def __init__(self, app: ASGIApp, classifier: RouteClassifier, **options):
+        self.app = app
+        self.classifier = classifier
+        self.session_app = SessionMiddleware(app, **options)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] in ("http", "websocket") and self.classifier.uses_session(
+            scope
+        ):
+            await self.session_app(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
@@ -0,0 +1,52 @@
+from typing import Any
+from typing import Optional
+
+from fastapi import Request
+
+from fastapi_dynamic_response.cache import LRUCache
+from fastapi_dynamic_response.globals import templates
+from fastapi_dynamic_response.settings import settings
+
+# rendered blocks keyed on (template, block, data digest)
+fragment_cache = LRUCache(maxsize=settings.FRAGMENT_CACHE_SIZE)
+
+
+def has_block(template_name: str, block_name: Optional[str]) -> bool:
+    if not block_name:
+        return False
+    return block_name in templates.get_template(template_name).blocks
+
+
+def render_block(
+    template_name: str,
+    block_name: str,
+    data: Any,
+    data_key: Optional[bytes] = None,
+    request: Optional[Request] = None,
+) -> str:
+    """Render a single block of a template, e.g. `content` of a page.
+
+    Only the block is rendered, the layout around it (base.html, the
+    navigation include, ...) is skipped. Templates without the block are
+    rendered whole. With `data_key`, a digest of `data`, the fragment is
+    cached so unchanged blocks are not rendered again, a `data_key` has to
+    cover the parts of `request` the block reads.
+    """
+    key = None
+    if data_key is not None:
+        key = (template_name, block_name, data_key)
+        cached = fragment_cache.get(key)
+        if cached is not None:
+            return cached
+
+    template = templates.get_template(template_name)
+    block = template.blocks.get(block_name)
+    if block is None:
+        html = template.render(data=data, request=request)
+    else:
+        context = template.new_context({"data": data, "request": request})
+        html = "".join(block(context))
+
+    if key is not None:
+        fragment_cache.set(key, html)
+    return html
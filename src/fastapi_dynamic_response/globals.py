@@ -1,5 +1,6 @@
 from fastapi.templating import Jinja2Templates
 
 is_ready = False
+preloaded = False
 templates = Jinja2Templates(directory="templates")
 routes = []
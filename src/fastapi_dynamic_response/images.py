@@ -0,0 +1,141 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from io import BytesIO
+from typing import Literal
+from typing import Optional
+
+from fastapi import Request
+from pydantic import BaseModel
+
+from fastapi_dynamic_response.settings import settings
+
+# Pillow format name and media type for each output format
+IMAGE_FORMATS = {
+    "png": ("PNG", "image/png"),
+    "webp": ("WEBP", "image/webp"),
+    "avif": ("AVIF", "image/avif"),
+    "jpeg": ("JPEG", "image/jpeg"),
+}
+FORMAT_ALIASES = {
+    "avif": "avif",
+    "image/avif": "avif",
+    "image/jpeg": "jpeg",
+    "image/png": "png",
+    "image/webp": "webp",
+    "jpeg": "jpeg",
+    "jpg": "jpeg",
+    "png": "png",
+    "webp": "webp",
+}
+
+
+class ImageOptions(BaseModel):
+    """How a page is captured and encoded when an image is requested."""
+
+    width: int
+    height: int
+    scale: float = 1.0
+    format: Literal["png", "webp", "avif", "jpeg"] = "png"
+    quality: int
+    # capture the whole document height instead of one window
+    full_page: bool = False
+    # longest edge of the returned image, aspect ratio is kept
+    thumbnail: Optional[int] = None
+
+    @property
+    def media_type(self) -> str:
+        return IMAGE_FORMATS[self.format][1]
+
+    @classmethod
+    def from_request(cls, request: Request) -> "ImageOptions":
+        """Read `?width=&height=&scale=&format=&quality=&full_page=&thumbnail=`.
+
+        The format falls back to the negotiated content type, so
+        `Accept: image/webp` works without a query parameter. Raises
+        ValueError on bad input.
+        """
+        params = request.query_params
+        config = settings.images
+
+        format_name = params.get("format") or request.state.content_type
+        if format_name not in FORMAT_ALIASES:
+            if "format" in params:
+                message = f"unsupported image format {format_name}"
+                raise ValueError(message)
+            format_name = "png"
+
+        return cls(
+            width=_bounded(params.get("width"), config.default_width, config.max_width),
+            height=_bounded(
+                params.get("height"), config.default_height, config.max_height
+            ),
+            scale=_bounded(
+                request.headers.get("scale", params.get("scale")),
+                1.0,
+                config.max_scale,
+                float,
+            ),
+            format=FORMAT_ALIASES[format_name],
+            quality=_bounded(params.get("quality"), config.quality, 100),
+            full_page=params.get("full_page", "").lower() in ("1", "true", "yes"),
+            thumbnail=_bounded(params.get("thumbnail"), None, config.max_thumbnail),
+        )
+
+
+def _bounded(value: Optional[str], default, maximum, kind=int):
+    if value is None or value == "":
+        return default
+    try:
+        number = kind(value)
+    except ValueError as e:
+        message = f"expected a number, got {value}"
+        raise ValueError(message) from e
+    if not 0 < number <= maximum:
+        message = f"{value} is out of range, expected up to {maximum}"
+        raise ValueError(message)
+    return number
+
+
+def encode_image(png: bytes, options: ImageOptions) -> bytes:
+    """Re-encode Chrome's PNG screenshot in the requested format and size."""
+    # loaded on first use, prewarm imports it up front
+    from PIL import Image  # noqa: PLC0415
+    from PIL import features  # noqa: PLC0415
+
+    pillow_format, _ = IMAGE_FORMATS[options.format]
+    if options.format in ("webp", "avif") and not features.check(options.format):
+        message = f"Pillow was built without {options.format} support"
+        raise ImportError(message)
+
+    with Image.open(BytesIO(png)) as screenshot:
+        screenshot.load()
+        image = screenshot
+        if options.thumbnail:
+            image.thumbnail(
+                (options.thumbnail, options.thumbnail), Image.Resampling.LANCZOS
+            )
+        if options.format == "jpeg" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+
+        save_options = {
+            "png": {"optimize": True},
+            "webp": {"quality": options.quality, "method": 4},
+            "avif": {"quality": options.quality},
+            "jpeg": {"quality": options.quality, "optimize": True, "progressive": True},
+        }[options.format]
+        buffer = BytesIO()
+        image.save(buffer, format=pillow_format, **save_options)
+        return buffer.getvalue()
+
+
+@lru_cache
+def image_pool() -> ThreadPoolExecutor:
+    # created on first use so forked workers do not share a pool
+    return ThreadPoolExecutor(
+        max_workers=settings.images.workers, thread_name_prefix="image"
+    )
+
+
+async def run_in_image_pool(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(image_pool(), func, *args)
@@ -2,6 +2,7 @@
 
 
 import logging
+import logging.config
 
 from fastapi_dynamic_response.settings import settings
 import structlog
@@ -18,7 +19,7 @@ def configure_logging():
         }
     )
 
-    if settings.ENV == "local":
+    if settings.ENV == "local" and not settings.FAST_STARTUP:
         # Local development logging configuration
         processors = [
             # structlog.processors.TimeStamper(fmt="iso"),
@@ -1,10 +1,16 @@
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
 
 from fastapi_dynamic_response import globals
 from fastapi_dynamic_response.__about__ import __version__
 from fastapi_dynamic_response.base.router import router as base_router
+from fastapi_dynamic_response.compression import PrecompressedStaticFiles
 from fastapi_dynamic_response.dependencies import get_content_type
+from fastapi_dynamic_response.profiler import flame_frames
+from fastapi_dynamic_response.projection import next_page_query
+from fastapi_dynamic_response.serialization import (
+    DynamicJSONResponse,
+    DynamicJSONRoute,
+)
 from fastapi_dynamic_response.zpages.router import router as zpages_router
 
 from fastapi_dynamic_response.settings import settings
@@ -15,6 +21,7 @@ from fastapi_dynamic_response.middleware import (
     add_process_time_header,
     catch_exceptions_middleware,
     log_requests,
+    prewarm,
     respond_based_on_content_type,
     set_bound_logger,
     set_prefers,
@@ -31,6 +38,7 @@ app = FastAPI(
     # openapi_tags=tags_metadata,
     # exception_handlers=exception_handlers,
     debug=settings.DEBUG,
+    default_response_class=DynamicJSONResponse,
     dependencies=[
         # Depends(set_prefers),
         # Depends(set_span_id),
@@ -38,6 +46,8 @@ app = FastAPI(
     ],
 )
 
+app.router.route_class = DynamicJSONRoute
+
 # configure_tracing(app)
 
 app.include_router(zpages_router)
@@ -50,23 +60,50 @@ app.middleware("http")(set_prefers)
 app.middleware("http")(set_span_id)
 app.middleware("http")(catch_exceptions_middleware)
 app.middleware("http")(set_bound_logger)
-app.mount("/static", StaticFiles(directory="static"), name="static")
+static_files = PrecompressedStaticFiles(directory="static")
+app.mount("/static", static_files, name="static")
+globals.templates.env.globals["static_version"] = static_files.version("app.css")
+globals.templates.env.filters["flamegraph"] = flame_frames
+globals.templates.env.filters["next_page"] = next_page_query
 
 from fastapi import Depends, Request
 from fastapi_dynamic_response.auth import BasicAuthBackend
+from fastapi_dynamic_response.fastpath import (
+    FastPathMiddleware,
+    RouteClassifier,
+    SessionRoutesMiddleware,
+)
 from starlette.middleware.authentication import AuthenticationMiddleware
-from starlette.middleware.sessions import SessionMiddleware
 
+route_classifier = RouteClassifier(app)
 app.add_middleware(AuthenticationMiddleware, backend=BasicAuthBackend())
-app.add_middleware(SessionMiddleware, secret_key="your-secret-key")
+app.add_middleware(
+    SessionRoutesMiddleware,
+    classifier=route_classifier,
+    secret_key=settings.SESSION_SECRET_KEY,
+)
+app.add_middleware(FastPathMiddleware, classifier=route_classifier)
+
+
+def preload():
+    """Build per-process caches, run once before forking workers when preloading."""
+    if globals.preloaded:
+        return
+    for template_name in globals.templates.env.list_templates():
+        globals.templates.get_template(template_name)
+    static_files.precompress()
+    prewarm(settings.PREWARM_FORMATS)
+    globals.routes = [route.path for route in app.router.routes if route.path]
+    route_classifier.classify()
+    globals.preloaded = True
 
 
 @app.on_event("startup")
 async def startup_event():
     # Perform startup actions, e.g., database connections
     # If all startup actions are successful, set is_ready to True
+    preload()
     globals.is_ready = True
-    globals.routes = [route.path for route in app.router.routes if route.path]
 
 
 @app.get("/sitemap")
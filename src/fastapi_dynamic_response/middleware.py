@@ -1,31 +1,66 @@
+import base64
 from difflib import get_close_matches
+from functools import lru_cache
+from http import HTTPStatus
+import importlib
 from fastapi_dynamic_response.settings import settings
 from io import BytesIO
-import json
 import time
 import traceback
-from typing import Any, Dict
+from typing import Any, Dict, Optional, Tuple
 from uuid import uuid4
 
-from fastapi import Request, Response
-from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse
-import html2text
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import (
+    HTMLResponse,
+    JSONResponse,
+    PlainTextResponse,
+    StreamingResponse,
+)
 from pydantic import BaseModel, model_validator
-from rich.console import Console
-from rich.markdown import Markdown
-from rich.panel import Panel
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
 
-import base64
-from fastapi_dynamic_response.constant import ACCEPT_TYPES
+from fastapi_dynamic_response.__about__ import __version__
+from fastapi_dynamic_response.columnar import stream_arrow, to_parquet, to_table
+from fastapi_dynamic_response.compression import compress_response
+from fastapi_dynamic_response.constant import (
+    ACCEPT_TYPES,
+    DEBUG_PREFIX,
+    PROBE_PATHS,
+    STATIC_PREFIX,
+)
+from fastapi_dynamic_response.fragments import has_block, render_block
 from fastapi_dynamic_response.globals import templates
+from fastapi_dynamic_response.images import (
+    ImageOptions,
+    encode_image,
+    run_in_image_pool,
+)
+from fastapi_dynamic_response.overload import overload
+from fastapi_dynamic_response.serialization import (
+    DynamicJSONResponse,
+    RouteContent,
+    encode_cbor,
+    encode_msgpack,
+    loads,
+    route_content,
+)
+from fastapi_dynamic_response.shared_cache import (
+    SharedRenderCache,
+    cache_key,
+    source_digest,
+)
+from fastapi_dynamic_response.singleflight import SingleFlight
 
 import structlog
 
 logger = structlog.get_logger()
 
-console = Console()
+render_flights = SingleFlight()
+render_cache = SharedRenderCache(
+    settings.render_cache,
+    # hashing the templates and static files waits for the first cached render
+    build=lambda: cache_key(__version__, source_digest("templates", "static")),
+)
 
 
 class Prefers(BaseModel):
@@ -37,6 +72,10 @@ class Prefers(BaseModel):
     partial: bool = False
     png: bool = False
     pdf: bool = False
+    msgpack: bool = False
+    cbor: bool = False
+    arrow: bool = False
+    parquet: bool = False
 
     def __repr__(self):
         _repr = []
@@ -49,6 +88,22 @@ class Prefers(BaseModel):
     def textlike(self) -> bool:
         return self.rtf or self.text or self.markdown
 
+    @property
+    def format(self) -> str:
+        """Name of the selected output format flag."""
+        for name, value in self:
+            if value and name != "partial":
+                return name
+        return "JSON"
+
+    @property
+    def columnar(self) -> bool:
+        return self.arrow or self.parquet
+
+    @property
+    def binary(self) -> bool:
+        return self.msgpack or self.cbor or self.columnar
+
     @model_validator(mode="after")
     def check_one_true(self) -> Dict[str, Any]:
         format_flags = [
@@ -59,14 +114,58 @@ class Prefers(BaseModel):
             self.markdown,
             self.png,
             self.pdf,
+            self.msgpack,
+            self.cbor,
+            self.arrow,
+            self.parquet,
         ]
         if format_flags.count(True) != 1:
-            message = "Exactly one of JSON, html, rtf, text, or markdown must be True."
+            message = (
+                "Exactly one of JSON, html, rtf, text, markdown, png, pdf, "
+                "msgpack, cbor, arrow, or parquet must be True."
+            )
             raise ValueError(message)
         return self
 
 
+# heavy renderer dependencies, imported the first time their format is
+# requested or up front by `prewarm`
+RENDERER_MODULES = {
+    "markdown": ["html2text"],
+    "rtf": ["html2text", "rich.console", "rich.markdown", "rich.panel"],
+    "png": ["selenium.webdriver", "selenium.webdriver.chrome.options", "PIL.Image"],
+    "pdf": ["selenium.webdriver", "selenium.webdriver.chrome.options"],
+    "msgpack": ["msgpack"],
+    "cbor": ["cbor2"],
+    "arrow": ["pyarrow"],
+    "parquet": ["pyarrow", "pyarrow.parquet"],
+}
+
+
+def prewarm(formats) -> None:
+    """Import the renderer dependencies for `formats` ahead of the first request."""
+    for format_name in formats:
+        for module in RENDERER_MODULES.get(format_name, []):
+            try:
+                importlib.import_module(module)
+            except ImportError:
+                logger.warning(
+                    "renderer not installed", format=format_name, module=module
+                )
+                break
+        else:
+            logger.info("prewarmed renderer", format=format_name)
+
+
+@lru_cache
+def get_console():
+    from rich.console import Console  # noqa: PLC0415 - loaded on first use
+
+    return Console()
+
+
 def log_request_state(request: Request):
+    console = get_console()
     console.log(request.state.span_id)
     console.log(request.url.path)
     console.log(request.state.prefers)
@@ -183,6 +282,23 @@ def set_prefers(
     return call_next(request)
 
 
+FORMAT_NAMES = {
+    name.lower(): name for name in Prefers.model_fields if name != "partial"
+}
+
+
+def override_prefers(request: Request, format_name: str) -> None:
+    """Let a route pick its own output format, e.g. from a query parameter."""
+    name = FORMAT_NAMES.get(format_name.lower())
+    if name is None:
+        raise HTTPException(status_code=400, detail=f"Unknown format {format_name}")
+    request.state.prefers = Prefers(**{name: True})
+    holder = getattr(request.state, "route_content", None)
+    if holder is not None:
+        holder.skip_json = request.state.prefers.binary
+    request.state.bound_logger = request.state.bound_logger.bind(prefers=name)
+
+
 class Sitemap:
     def __init__(self, app):
         self.app = app
@@ -220,22 +336,54 @@ def is_rtf_request(user_agent: str) -> bool:
     return any(keyword in user_agent.lower() for keyword in rtf_keywords)
 
 
-def get_screenshot(html_content: str) -> BytesIO:
+def get_screenshot(html_content: str, options: ImageOptions) -> BytesIO:
+    # loaded on first use, prewarm imports it up front
+    from selenium import webdriver  # noqa: PLC0415
+    from selenium.webdriver.chrome.options import Options  # noqa: PLC0415
+
     chrome_options = Options()
     chrome_options.add_argument("--headless")
     chrome_options.add_argument("--disable-gpu")
     chrome_options.add_argument("--no-sandbox")
-    chrome_options.add_argument("--window-size=1280x1024")
+    chrome_options.add_argument(f"--window-size={options.width},{options.height}")
 
     driver = webdriver.Chrome(options=chrome_options)
-    driver.get("data:text/html;charset=utf-8," + html_content)
-    screenshot = driver.get_screenshot_as_png()
-    driver.quit()
-    buffer = BytesIO(screenshot)
+    try:
+        driver.get("data:text/html;charset=utf-8," + html_content)
+        height = options.height
+        if options.full_page:
+            height = min(
+                driver.execute_script("return document.documentElement.scrollHeight"),
+                settings.images.max_height,
+            )
+        driver.execute_cdp_cmd(
+            "Emulation.setDeviceMetricsOverride",
+            {
+                "width": options.width,
+                "height": height,
+                "deviceScaleFactor": options.scale,
+                "mobile": False,
+            },
+        )
+        screenshot = driver.execute_cdp_cmd(
+            "Page.captureScreenshot",
+            {"format": "png", "captureBeyondViewport": options.full_page},
+        )["data"]
+    finally:
+        driver.quit()
+    buffer = BytesIO(base64.b64decode(screenshot))
     return buffer
 
 
+def screenshot_image(html_content: str, options: ImageOptions) -> bytes:
+    return encode_image(get_screenshot(html_content, options).getvalue(), options)
+
+
 def get_pdf(html_content: str, scale: float = 1.0) -> BytesIO:
+    # loaded on first use, prewarm imports it up front
+    from selenium import webdriver  # noqa: PLC0415
+    from selenium.webdriver.chrome.options import Options  # noqa: PLC0415
+
     chrome_options = Options()
     chrome_options.add_argument("--headless")
     chrome_options.add_argument("--disable-gpu")
@@ -290,14 +438,21 @@ def format_json_as_plain_text(data: dict) -> str:
     return "\n".join(output_lines)
 
 
-def format_json_as_rich_text(data: dict, template_name: str) -> str:
+def format_json_as_rich_text(
+    data: dict, template_name: str, request: Optional[Request] = None
+) -> str:
     """Convert JSON to a human-readable rich text format using rich."""
+    # loaded on first use, prewarm imports them up front
+    import html2text  # noqa: PLC0415
+    from rich.console import Console  # noqa: PLC0415
+    from rich.markdown import Markdown  # noqa: PLC0415
+    from rich.panel import Panel  # noqa: PLC0415
 
     # pretty_data = Pretty(data, indent_guides=True)
     console = Console()
 
     template = templates.get_template(template_name)
-    html_content = template.render(data=data)
+    html_content = template.render(data=data, request=request)
     markdown_content = html2text.html2text(html_content)
 
     with console.capture() as capture:
@@ -312,7 +467,7 @@ def format_json_as_rich_text(data: dict, template_name: str) -> str:
     return capture.get()
 
 
-def handle_not_found(request: Request, call_next, data: str):
+def handle_not_found(request: Request, call_next, data: bytes):
     requested_path = request.url.path
     # available_routes = [route.path for route in app.router.routes if route.path]
     suggestions = get_close_matches(
@@ -325,7 +480,7 @@ def handle_not_found(request: Request, call_next, data: str):
         "404.html",
         {
             "request": request,
-            "data": json.loads(data),
+            "data": loads(data),
             "available_routes": request.state.routes,
             "requested_path": requested_path,
             "suggestions": suggestions,
@@ -342,26 +497,26 @@ async def respond_based_on_content_type(request: Request, call_next):
         return await call_next(request)
 
     try:
-        response = await call_next(request)
-
-        if response.status_code == 404:
-            request.state.bound_logger.info("404 not found")
-            body = b"".join([chunk async for chunk in response.body_iterator])
-            data = body.decode("utf-8")
-            response = handle_not_found(
-                request=request,
-                call_next=call_next,
-                data=data,
+        key = render_key(request)
+        if key is None:
+            return compress_response(
+                request, await render_dynamic_response(request, call_next)
             )
-        elif str(response.status_code)[0] not in "123":
-            request.state.bound_logger.info(f"non-200 response {response.status_code}")
-            # return await handle_response(request, response, data)
-            return response
-        else:
-            body = b"".join([chunk async for chunk in response.body_iterator])
-            data = body.decode("utf-8")
 
-        return await handle_response(request, response, data)
+        async def render():
+            response = await render_dynamic_response(request, call_next)
+            return response, snapshot_response(response)
+
+        (response, snapshot), coalesced = await render_flights.do(key, render)
+        if coalesced:
+            if snapshot is None:
+                # error responses are not shared
+                response = await render_dynamic_response(request, call_next)
+            else:
+                request.state.bound_logger.info("coalesced render")
+                response = restore_response(snapshot)
+                response.headers["x-coalesced"] = "true"
+        return compress_response(request, response)
     except Exception as e:
         request.state.bound_logger.info("internal server error")
         # print(traceback.format_exc())
@@ -377,24 +532,319 @@ async def respond_based_on_content_type(request: Request, call_next):
             )
 
 
+async def render_dynamic_response(request: Request, call_next) -> Response:
+    request.state.route_content = RouteContent(skip_json=request.state.prefers.binary)
+    token = route_content.set(request.state.route_content)
+    try:
+        response = await call_next(request)
+    finally:
+        route_content.reset(token)
+
+    # pushed updates are rendered by the hub, routes that build their own
+    # response (the profiler's svg) set request.state.raw_response
+    raw = getattr(request.state, "raw_response", False)
+    if raw or response.headers.get("content-type", "").startswith("text/event-stream"):
+        return response
+
+    if response.status_code == 404:
+        request.state.bound_logger.info("404 not found")
+        data = b"".join([chunk async for chunk in response.body_iterator])
+        response = handle_not_found(
+            request=request,
+            call_next=call_next,
+            data=data,
+        )
+    elif str(response.status_code)[0] not in "123":
+        request.state.bound_logger.info(f"non-200 response {response.status_code}")
+        # return await handle_response(request, response, data)
+        return response
+    else:
+        data = b"".join([chunk async for chunk in response.body_iterator])
+
+    return await handle_response(request, response, data)
+
+
+def is_event_stream(request: Request) -> bool:
+    return "text/event-stream" in request.headers.get("accept", "")
+
+
+def render_key(request: Request) -> Optional[Tuple]:
+    """Everything a render depends on, requests with equal keys share one render."""
+    if not settings.SINGLE_FLIGHT or request.method not in ("GET", "HEAD"):
+        return None
+    if request.state.prefers.arrow or is_event_stream(request):
+        # streamed bodies cannot be shared between requests
+        return None
+    if "cookie" in request.headers or "session" in request.scope:
+        # the render can read or update per-client state, SessionRoutesMiddleware
+        # only sets scope["session"] for routes marked with `uses_session`
+        return None
+    auth = request.scope.get("auth")
+    user = request.scope.get("user")
+    return (
+        request.method,
+        request.url.path,
+        tuple(sorted(request.query_params.multi_items())),
+        request.state.content_type,
+        request.state.prefers.format,
+        request.state.prefers.partial,
+        request.headers.get("scale"),
+        request.headers.get("hx-target"),
+        frozenset(auth.scopes) if auth is not None else None,
+        user.display_name if user is not None and user.is_authenticated else None,
+    )
+
+
+def snapshot_response(response: Response) -> Optional[Tuple[int, tuple, bytes]]:
+    body = getattr(response, "body", None)
+    if body is None:
+        return None
+    # a shed render is shed for everyone waiting on it, other errors are
+    # rendered again by each request
+    shed = response.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+    if not shed and str(response.status_code)[0] not in "123":
+        return None
+    # copy the headers now, compression later mutates them in place
+    return response.status_code, tuple(response.raw_headers), body
+
+
+def restore_response(snapshot: Tuple[int, tuple, bytes]) -> Response:
+    status_code, raw_headers, body = snapshot
+    response = Response(content=body, status_code=status_code)
+    response.raw_headers = list(raw_headers)
+    return response
+
+
+BINARY_ENCODERS = {
+    "msgpack": (encode_msgpack, "application/msgpack"),
+    "cbor": (encode_cbor, "application/cbor"),
+}
+
+
+def render_binary(request: Request, data: bytes) -> Response:
+    """Serialize the route's original output without a JSON round trip."""
+    holder = getattr(request.state, "route_content", None)
+    if holder is not None and holder.captured:
+        content = holder.content
+    else:
+        content = loads(data)
+
+    if request.state.prefers.columnar:
+        return render_columnar(request, content)
+
+    name = "msgpack" if request.state.prefers.msgpack else "cbor"
+    encoder, media_type = BINARY_ENCODERS[name]
+    request.state.bound_logger.info(f"returning {name}")
+    try:
+        body = encoder(content)
+    except ImportError:
+        return PlainTextResponse(
+            content=f"{name} output is not available on this server",
+            status_code=406,
+        )
+    return Response(content=body, media_type=media_type)
+
+
+def render_columnar(request: Request, content: Any) -> Response:
+    """Return tabular route data as an Arrow IPC stream or a Parquet file."""
+    name = "arrow" if request.state.prefers.arrow else "parquet"
+    request.state.bound_logger.info(f"returning {name}")
+    try:
+        table = to_table(content)
+    except ImportError:
+        return PlainTextResponse(
+            content=f"{name} output is not available on this server",
+            status_code=406,
+        )
+    except (TypeError, ValueError) as e:
+        # pyarrow's ArrowInvalid and ArrowTypeError derive from these
+        return PlainTextResponse(
+            content=f"response data is not tabular: {e!s}",
+            status_code=406,
+        )
+
+    if request.state.prefers.arrow:
+        return StreamingResponse(
+            stream_arrow(table, settings.ARROW_BATCH_SIZE),
+            media_type="application/vnd.apache.arrow.stream",
+        )
+    return Response(
+        content=to_parquet(table),
+        media_type="application/vnd.apache.parquet",
+    )
+
+
 async def handle_response(
     request: Request,
     response: Response,
-    data: str,
+    data: bytes,
 ):
-    json_data = json.loads(data)
+    if request.state.prefers.JSON:
+        request.state.bound_logger.info("returning JSON")
+        # the route output is already JSON, pass it through without a
+        # parse and re-encode round trip
+        return Response(
+            content=data,
+            media_type="application/json",
+        )
+
+    if request.state.prefers.binary:
+        return render_binary(request, data)
+
+    json_data = loads(data)
 
     template_name = getattr(request.state, "template_name", "default_template.html")
+    block_name = None
     if request.state.prefers.partial:
-        request.state.bound_logger = logger.bind(template_name=template_name)
-        template_name = "partial_" + template_name
+        block_name = fragment_block(request, template_name)
+        request.state.bound_logger = request.state.bound_logger.bind(
+            template_name=template_name, block_name=block_name
+        )
 
-    if request.state.prefers.JSON:
-        request.state.bound_logger.info("returning JSON")
+    if request.state.prefers.png:
+        try:
+            request.state.image_options = ImageOptions.from_request(request)
+        except ValueError as e:
+            return PlainTextResponse(content=str(e), status_code=400)
+
+    key = render_cache_key(request, template_name, block_name, data)
+    if key is not None:
+        cached = render_cache.get(key)
+        if cached is not None:
+            body, content_type = cached
+            request.state.bound_logger.info("returning cached render")
+            return Response(content=body, media_type=content_type)
+
+    response = await render_admitted(
+        request, json_data, template_name, block_name, data
+    )
+    if key is not None and response.status_code == HTTPStatus.OK:
+        render_cache.set(key, response.body, response.headers["content-type"])
+    return response
+
+
+def counts_toward_overload(request: Request) -> bool:
+    """Probes, static files, debug pages and pushed streams are not renders."""
+    path = request.url.path
+    return not (
+        path in PROBE_PATHS
+        or path.startswith((STATIC_PREFIX, DEBUG_PREFIX))
+        or is_event_stream(request)
+    )
+
+
+async def render_admitted(
+    request: Request,
+    json_data: Any,
+    template_name: str,
+    block_name: Optional[str],
+    data: bytes,
+) -> Response:
+    """Render a cache miss against the overload budget, or shed it with 503.
+
+    Only the request that actually renders is charged and timed, single-flight
+    followers and render cache hits never get here.
+    """
+    if not counts_toward_overload(request):
+        return await render_page(request, json_data, template_name, block_name, data)
+
+    format_name = request.state.prefers.format
+    if not overload.admit(format_name):
+        retry_after = overload.retry_after()
+        request.state.bound_logger.warning(
+            "shedding request", format=format_name, retry_after=retry_after
+        )
         return JSONResponse(
-            content=json_data,
+            content={"detail": f"Server overloaded, {format_name} is unavailable"},
+            status_code=503,
+            headers={"Retry-After": str(retry_after)},
         )
 
+    start_time = time.perf_counter()
+    try:
+        return await render_page(request, json_data, template_name, block_name, data)
+    finally:
+        overload.finish(format_name, time.perf_counter() - start_time)
+
+
+async def render_page(
+    request: Request,
+    json_data: Any,
+    template_name: str,
+    block_name: Optional[str],
+    data: bytes,
+) -> Response:
+    if block_name is not None and request.state.prefers.html:
+        request.state.bound_logger.info("returning html fragment")
+        return HTMLResponse(
+            render_block(
+                template_name,
+                block_name,
+                json_data,
+                # the block's links carry the query parameters over
+                cache_key(data, request.url.query),
+                request,
+            )
+        )
+    if request.state.prefers.png:
+        return await render_image(request, json_data, template_name)
+    return render_template_formats(request, json_data, template_name)
+
+
+async def render_image(request: Request, json_data: Any, template_name: str):
+    """Screenshot the rendered template and encode it in the image pool."""
+    options = request.state.image_options
+    request.state.bound_logger.info("returning image", **options.model_dump())
+    template = templates.get_template(template_name)
+    html_content = template.render(data=json_data, request=request)
+    try:
+        body = await run_in_image_pool(screenshot_image, html_content, options)
+    except ImportError:
+        return PlainTextResponse(
+            content=f"{options.format} output is not available on this server",
+            status_code=406,
+        )
+    return Response(content=body, media_type=options.media_type)
+
+
+def fragment_block(request: Request, template_name: str) -> str:
+    """Pick the block an htmx request swaps in.
+
+    A route can set `request.state.block_name`, otherwise HX-Target is used
+    when it names a block of the template, falling back to FRAGMENT_BLOCK.
+    """
+    block_name = getattr(request.state, "block_name", None)
+    if block_name:
+        return block_name
+    target = request.headers.get("hx-target")
+    if has_block(template_name, target):
+        return target
+    return settings.FRAGMENT_BLOCK
+
+
+def render_cache_key(
+    request: Request, template_name: str, block_name: Optional[str], data: bytes
+):
+    """Key a render on everything that goes into it, or None to skip caching."""
+    if render_cache.disabled:
+        return None
+    if request.state.prefers.format not in settings.render_cache.formats:
+        return None
+    return cache_key(
+        # another build's process can still be writing to the same file
+        render_cache.build,
+        request.state.prefers.format,
+        template_name,
+        block_name,
+        request.headers.get("scale", request.query_params.get("scale")),
+        getattr(request.state, "image_options", None),
+        # pagination links keep the other query parameters
+        request.url.query,
+        data,
+    )
+
+
+def render_template_formats(request: Request, json_data: Any, template_name: str):
     if request.state.prefers.html:
         request.state.bound_logger.info("returning html")
         return templates.TemplateResponse(
@@ -407,7 +857,7 @@ async def handle_response(
         import html2text
 
         template = templates.get_template(template_name)
-        html_content = template.render(data=json_data)
+        html_content = template.render(data=json_data, request=request)
         markdown_content = html2text.html2text(html_content)
         return PlainTextResponse(content=markdown_content)
 
@@ -420,29 +870,19 @@ async def handle_response(
 
     if request.state.prefers.rtf:
         request.state.bound_logger.info("returning rich text")
-        rich_text_content = format_json_as_rich_text(json_data, template_name)
+        rich_text_content = format_json_as_rich_text(json_data, template_name, request)
         return PlainTextResponse(
             content=rich_text_content,
         )
 
-    if request.state.prefers.png:
-        request.state.bound_logger.info("returning PNG")
-        template = templates.get_template(template_name)
-        html_content = template.render(data=json_data)
-        screenshot = get_screenshot(html_content)
-        return Response(
-            content=screenshot.getvalue(),
-            media_type="image/png",
-        )
-
     if request.state.prefers.pdf:
         request.state.bound_logger.info("returning PDF")
         template = templates.get_template(template_name)
-        html_content = template.render(data=json_data)
+        html_content = template.render(data=json_data, request=request)
         scale = float(
             request.headers.get("scale", request.query_params.get("scale", 1.0))
         )
-        console.log(f"Scale: {scale}")
+        request.state.bound_logger.info("pdf scale", scale=scale)
         pdf = get_pdf(html_content, scale)
 
         return Response(
@@ -451,7 +891,7 @@ async def handle_response(
         )
 
     request.state.bound_logger.info("returning DEFAULT JSON")
-    return JSONResponse(
+    return DynamicJSONResponse(
         content=json_data,
     )
 
@@ -0,0 +1,89 @@
+import math
+import time
+from collections import Counter
+from typing import Dict
+from typing import Optional
+
+from fastapi_dynamic_response.settings import Overload
+from fastapi_dynamic_response.settings import settings
+
+
+class OverloadController:
+    """Track in-flight work per format and decide what to shed under pressure.
+
+    Pressure is the estimated outstanding work, the sum over formats of
+    in-flight requests times their recent average latency, divided by the
+    configured budget. Each format has its own pressure threshold so
+    expensive renders (png, pdf, rtf) are shed long before cheap ones.
+    """
+
+    def __init__(self, config: Overload):
+        self.config = config
+        self.in_flight: Counter = Counter()
+        self.latency: Dict[str, float] = dict(config.initial_latency)
+        self.admitted: Counter = Counter()
+        self.shed: Counter = Counter()
+        self.overloaded_since: Optional[float] = None
+
+    def outstanding(self) -> float:
+        return sum(
+            count * self.latency.get(format_name, self.config.default_latency)
+            for format_name, count in self.in_flight.items()
+        )
+
+    def pressure(self) -> float:
+        pressure = self.outstanding() / self.config.budget_seconds
+        if pressure >= 1.0:
+            if self.overloaded_since is None:
+                self.overloaded_since = time.monotonic()
+        else:
+            self.overloaded_since = None
+        return pressure
+
+    def admit(self, format_name: str) -> bool:
+        threshold = self.config.shed_at.get(format_name)
+        if (
+            self.config.enabled
+            and threshold is not None
+            and self.pressure() >= threshold
+        ):
+            self.shed[format_name] += 1
+            return False
+        self.admitted[format_name] += 1
+        self.in_flight[format_name] += 1
+        return True
+
+    def finish(self, format_name: str, elapsed: float) -> None:
+        self.in_flight[format_name] -= 1
+        # unmeasured formats start from the default, one slow first sample
+        # must not become the format's latency
+        previous = self.latency.get(format_name, self.config.default_latency)
+        alpha = self.config.latency_alpha
+        self.latency[format_name] = alpha * elapsed + (1 - alpha) * previous
+        self.pressure()
+
+    def retry_after(self) -> int:
+        """Seconds until the current backlog should have drained."""
+        return max(1, math.ceil(self.outstanding()))
+
+    def sustained_overload(self) -> bool:
+        self.pressure()
+        return (
+            self.config.enabled
+            and self.overloaded_since is not None
+            and time.monotonic() - self.overloaded_since
+            >= self.config.sustained_seconds
+        )
+
+    def stats(self) -> dict:
+        return {
+            "pressure": round(self.pressure(), 3),
+            "sustained_overload": self.sustained_overload(),
+            "in_flight": dict(+self.in_flight),
+            "latency": {k: round(v, 4) for k, v in self.latency.items()},
+            "admitted": dict(self.admitted),
+            "shed": dict(self.shed),
+        }
+
+
+overload = OverloadController(settings.overload)
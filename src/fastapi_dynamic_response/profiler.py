@@ -0,0 +1,154 @@
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import zlib
+from collections import Counter
+from typing import Dict
+from typing import List
+from typing import Optional
+
+# one profile or heap snapshot per worker at a time
+profile_lock = threading.Lock()
+# flamegraph frames narrower than this many pixels are not drawn
+MIN_FRAME_WIDTH = 0.5
+
+
+def frame_label(frame) -> str:
+    code = frame.f_code
+    filename = os.sep.join(code.co_filename.split(os.sep)[-2:])
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+def sample_stacks(seconds: float, interval: float) -> Counter:
+    """Sample every thread's stack for `seconds`, returns collapsed stack counts.
+
+    Runs in its own thread, the event loop keeps serving while it is sampled.
+    """
+    own = threading.get_ident()
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    stacks: Counter = Counter()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        for ident, top in sys._current_frames().items():
+            if ident == own:
+                continue
+            labels = []
+            frame = top
+            while frame is not None:
+                labels.append(frame_label(frame))
+                frame = frame.f_back
+            labels.append(names.get(ident, str(ident)))
+            stacks[";".join(reversed(labels))] += 1
+        time.sleep(interval)
+    return stacks
+
+
+def collapsed(stacks: Dict[str, int]) -> str:
+    """Brendan Gregg's collapsed format, the input of flamegraph.pl and speedscope."""
+    return "".join(
+        f"{stack} {count}\n"
+        for stack, count in sorted(stacks.items(), key=lambda item: item[0])
+    )
+
+
+def flame_frames(
+    stacks: Dict[str, int], width: int = 1200, row_height: int = 16
+) -> dict:
+    """Lay collapsed stacks out as flamegraph rectangles for the svg template."""
+    root = {"count": 0, "children": {}}
+    for stack, count in stacks.items():
+        root["count"] += count
+        node = root
+        for name in stack.split(";"):
+            node = node["children"].setdefault(name, {"count": 0, "children": {}})
+            node["count"] += count
+
+    frames: List[dict] = []
+    total = root["count"] or 1
+    scale = width / total
+    depth = 0
+
+    def walk(node: dict, x: float, level: int):
+        nonlocal depth
+        depth = max(depth, level)
+        for name, child in sorted(node["children"].items()):
+            child_width = child["count"] * scale
+            if child_width >= MIN_FRAME_WIDTH:
+                frames.append(
+                    {
+                        "name": name,
+                        "x": round(x, 2),
+                        "level": level,
+                        "width": round(child_width, 2),
+                        "count": child["count"],
+                        "percent": round(100 * child["count"] / total, 2),
+                        "hue": zlib.crc32(name.encode()) % 60,
+                    }
+                )
+                walk(child, x, level + 1)
+            x += child_width
+
+    walk(root, 0.0, 0)
+    height = (depth + 1) * row_height
+    for frame in frames:
+        # flames grow up from the bottom
+        frame["y"] = height - (frame["level"] + 1) * row_height
+    return {
+        "frames": frames,
+        "width": width,
+        "height": height,
+        "row_height": row_height,
+        "samples": root["count"],
+    }
+
+
+def heap_diff(seconds: float, limit: int, frames: int = 1) -> dict:
+    """Diff two tracemalloc snapshots taken `seconds` apart, top allocators first.
+
+    Tracing is started for the window when it is not already on, so the
+    overhead is only paid while the endpoint is being called.
+    """
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start(frames)
+    try:
+        before = tracemalloc.take_snapshot()
+        time.sleep(seconds)
+        after = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        if started:
+            tracemalloc.stop()
+
+    filters = [
+        tracemalloc.Filter(inclusive=False, filename_pattern=tracemalloc.__file__)
+    ]
+    stats = after.filter_traces(filters).compare_to(
+        before.filter_traces(filters), "lineno"
+    )
+    return {
+        "seconds": seconds,
+        "traced_memory": {"current": current, "peak": peak},
+        "top": [
+            {
+                "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                "size_diff": stat.size_diff,
+                "size": stat.size,
+                "count_diff": stat.count_diff,
+                "count": stat.count,
+            }
+            for stat in stats[:limit]
+        ],
+    }
+
+
+def run_exclusive(func, *args) -> Optional[dict]:
+    """Run `func` unless another profile holds the lock, None when busy."""
+    if not profile_lock.acquire(blocking=False):
+        return None
+    try:
+        return func(*args)
+    finally:
+        profile_lock.release()
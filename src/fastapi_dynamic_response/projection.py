@@ -0,0 +1,157 @@
+import base64
+import binascii
+import inspect
+import json
+from functools import wraps
+from typing import Any
+from typing import Dict
+from typing import Optional
+from typing import Tuple
+from urllib.parse import urlencode
+
+from fastapi import Depends
+from fastapi import HTTPException
+from fastapi import Request
+
+from fastapi_dynamic_response.dependencies import get_projection
+
+
+def parse_fields(fields: Optional[str]) -> Optional[Dict[str, dict]]:
+    """Turn `message,data.id` into a tree of the paths to keep."""
+    if not fields:
+        return None
+    tree: Dict[str, dict] = {}
+    for path in fields.split(","):
+        node = tree
+        for name in path.strip().split("."):
+            if name:
+                node = node.setdefault(name, {})
+    return tree or None
+
+
+def project(value: Any, tree: Dict[str, dict]) -> Any:
+    """Keep only the fields in `tree`, lists are projected item by item."""
+    if not tree:
+        return value
+    if isinstance(value, dict):
+        return {
+            name: project(value[name], subtree)
+            for name, subtree in tree.items()
+            if name in value
+        }
+    if isinstance(value, list):
+        return [project(item, tree) for item in value]
+    return value
+
+
+def encode_cursor(offset: int, limit: int) -> str:
+    raw = json.dumps([offset, limit], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, max_limit: int) -> Tuple[int, int]:
+    """Read a cursor from `encode_cursor`, rejecting any we could not have made."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        offset, limit = json.loads(raw)
+    except (binascii.Error, ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from e
+    # bool is an int subclass, json true must not pass as 1
+    if type(offset) is not int or type(limit) is not int:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if offset < 0 or not 1 <= limit <= max_limit:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return offset, limit
+
+
+def paginate(
+    content: dict,
+    list_key: str,
+    projection: dict,
+    default_limit: Optional[int],
+    max_limit: int,
+) -> dict:
+    """Slice `content[list_key]` to one page and add `next_cursor`.
+
+    `projection` is the `get_projection` value, its cursor and limit pick the
+    page.
+    """
+    offset = 0
+    cursor, limit = projection["cursor"], projection["limit"]
+    if cursor:
+        offset, cursor_limit = decode_cursor(cursor, max_limit)
+        limit = limit or cursor_limit
+    limit = limit or default_limit
+    if limit is None or not isinstance(content.get(list_key), list):
+        return content
+
+    limit = min(limit, max_limit)
+    items = content[list_key]
+    end = offset + limit
+    return {
+        **content,
+        list_key: items[offset:end],
+        "next_cursor": encode_cursor(end, limit) if end < len(items) else None,
+    }
+
+
+def next_page_query(cursor: str, request: Any = None) -> str:
+    """Query string of the next page, for `href="?{{ cursor | next_page(request) }}"`.
+
+    The request's other parameters (fields, content-type, limit) carry over
+    so the next page keeps its projection and format. Renders without a
+    request, like pushed updates, only get the cursor.
+    """
+    if not isinstance(request, Request):
+        return urlencode({"cursor": cursor})
+    return request.url.include_query_params(cursor=cursor).query
+
+
+def projected(
+    list_key: Optional[str] = None,
+    default_limit: Optional[int] = None,
+    max_limit: int = 1000,
+):
+    """Apply `?fields=` and, with `list_key`, `?limit=`/`?cursor=` to route output.
+
+    The route output is trimmed before it reaches the dynamic response
+    middleware, so no renderer sees fields or list items the client did not
+    ask for. The query parameters come from `get_projection`, which the
+    decorator adds to the route's signature.
+    """
+
+    def decorator(func: callable):
+        @wraps(func)
+        async def wrapper(request: Request, *args, **kwargs):
+            projection = kwargs.pop("projection")
+            tree = parse_fields(projection["fields"])
+            content = await func(request, *args, **kwargs)
+            if not isinstance(content, dict):
+                return content
+
+            paged = list_key is not None and (tree is None or list_key in tree)
+            if paged:
+                content = paginate(
+                    content, list_key, projection, default_limit, max_limit
+                )
+            if tree is not None:
+                if "next_cursor" in content:
+                    tree = {**tree, "next_cursor": {}}
+                content = project(content, tree)
+            return content
+
+        signature = inspect.signature(func)
+        wrapper.__signature__ = signature.replace(
+            parameters=[
+                *signature.parameters.values(),
+                inspect.Parameter(
+                    "projection",
+                    inspect.Parameter.KEYWORD_ONLY,
+                    default=Depends(get_projection),
+                    annotation=dict,
+                ),
+            ]
+        )
+        return wrapper
+
+    return decorator
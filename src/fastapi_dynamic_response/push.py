@@ -0,0 +1,286 @@
+import asyncio
+from typing import Any
+from typing import AsyncIterator
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
+
+import structlog
+from fastapi import Request
+from fastapi import WebSocket
+from fastapi.responses import PlainTextResponse
+from fastapi.responses import StreamingResponse
+
+from fastapi_dynamic_response.constant import ACCEPT_TYPES
+from fastapi_dynamic_response.fragments import render_block
+from fastapi_dynamic_response.globals import templates
+from fastapi_dynamic_response.serialization import dumps
+from fastapi_dynamic_response.settings import settings
+from fastapi_dynamic_response.shared_cache import cache_key
+
+logger = structlog.get_logger()
+
+PUSH_FORMATS = ("html", "JSON")
+
+# (event name, payload)
+Event = Tuple[str, str]
+
+
+def render_parts(format_name: str, template_name: str, data: Any) -> Dict[str, str]:
+    """Render an update into named parts that are diffed independently.
+
+    html is split into the blocks of the template, JSON into its top level
+    keys.
+    """
+    if format_name == "html":
+        data_key = cache_key(dumps(data))
+        return {
+            name: render_block(template_name, name, data, data_key)
+            for name in templates.get_template(template_name).blocks
+        }
+    if isinstance(data, dict):
+        return {key: dumps(value).decode() for key, value in data.items()}
+    return {"": dumps(data).decode()}
+
+
+def diff_events(
+    format_name: str, old: Dict[str, str], new: Dict[str, str], data: Any
+) -> List[Event]:
+    """Events that bring a subscriber holding `old` up to `new`."""
+    changed = [name for name, part in new.items() if old.get(name) != part]
+    if format_name == "html":
+        return [(name, new[name]) for name in changed]
+
+    removed = [name for name in old if name not in new]
+    if not changed and not removed:
+        return []
+    if "" in new:
+        # not a dict, there is nothing smaller to send than the whole value
+        return [("patch", dumps({"set": data, "unset": []}).decode())]
+    patch = {"set": {name: data[name] for name in changed}, "unset": removed}
+    return [("patch", dumps(patch).decode())]
+
+
+class Topic:
+    """One stream of updates and everyone subscribed to it.
+
+    Each update is rendered once per subscribed format and the resulting
+    diff is fanned out to every subscriber of that format. A subscriber that
+    falls `queue_size` updates behind is dropped back to a full snapshot
+    rather than buffering without bound.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        template_name: str,
+        source: Optional[Callable[[], AsyncIterator[Any]]] = None,
+    ):
+        self.name = name
+        self.template_name = template_name
+        self.source = source
+        self.subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        # last rendered parts for each format with subscribers
+        self.parts: Dict[str, Dict[str, str]] = {}
+        self.has_data = False
+        self.data: Any = None
+        self.task: Optional[asyncio.Task] = None
+        self.published = 0
+        self.renders = 0
+        self.resyncs = 0
+
+    def publish(self, data: Any) -> None:
+        self.data = data
+        self.has_data = True
+        self.published += 1
+        for format_name, queues in self.subscribers.items():
+            parts = self._render(format_name)
+            events = diff_events(
+                format_name, self.parts.get(format_name, {}), parts, data
+            )
+            self.parts[format_name] = parts
+            if not events:
+                continue
+            for queue in queues:
+                self._offer(queue, format_name, events)
+
+    def _render(self, format_name: str) -> Dict[str, str]:
+        self.renders += 1
+        return render_parts(format_name, self.template_name, self.data)
+
+    def _snapshot(self, format_name: str) -> List[Event]:
+        return diff_events(format_name, {}, self.parts[format_name], self.data)
+
+    def _offer(self, queue: asyncio.Queue, format_name: str, events: List[Event]):
+        try:
+            queue.put_nowait(events)
+        except asyncio.QueueFull:
+            while not queue.empty():
+                queue.get_nowait()
+            self.resyncs += 1
+            queue.put_nowait(self._snapshot(format_name))
+
+    def join(self, format_name: str, queue: asyncio.Queue) -> None:
+        queues = self.subscribers.setdefault(format_name, set())
+        if self.has_data:
+            if not queues:
+                # nobody kept this format's parts current
+                self.parts[format_name] = self._render(format_name)
+            queue.put_nowait(self._snapshot(format_name))
+        queues.add(queue)
+        if self.source is not None and self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    def leave(self, format_name: str, queue: asyncio.Queue) -> None:
+        queues = self.subscribers.get(format_name, set())
+        queues.discard(queue)
+        if not queues:
+            self.subscribers.pop(format_name, None)
+            self.parts.pop(format_name, None)
+        if not self.subscribers and self.task is not None:
+            self.task.cancel()
+            self.task = None
+            # a source only runs while watched, its last value goes stale
+            self.has_data = False
+            self.data = None
+
+    async def _run(self) -> None:
+        try:
+            async for data in self.source():
+                self.publish(data)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("push source failed", topic=self.name)
+
+    async def events(
+        self, format_name: str, timeout: Optional[float] = None
+    ) -> AsyncIterator[Optional[List[Event]]]:
+        """Yield event lists for one subscriber, None after `timeout` idle seconds."""
+        queue = asyncio.Queue(maxsize=settings.push.queue_size)
+        self.join(format_name, queue)
+        try:
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            self.leave(format_name, queue)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": {
+                format_name: len(queues)
+                for format_name, queues in self.subscribers.items()
+            },
+            "published": self.published,
+            "renders": self.renders,
+            "resyncs": self.resyncs,
+        }
+
+
+def sse_message(name: str, payload: str) -> str:
+    lines = payload.splitlines() or [""]
+    return f"event: {name}\n" + "".join(f"data: {line}\n" for line in lines) + "\n"
+
+
+def ws_message(format_name: str, events: List[Event]) -> str:
+    if format_name == "html":
+        # out of band swaps, so the htmx ws extension replaces each block by id
+        return "".join(
+            f'<div id="{name}" hx-swap-oob="true">{html}</div>' for name, html in events
+        )
+    return "\n".join(payload for _, payload in events)
+
+
+class PushHub:
+    """Topics that routes push updates to over Server-Sent Events or WebSockets.
+
+    A topic either has a `source`, an async generator that runs while the
+    topic has subscribers, or is fed with `publish` from anywhere in the
+    process. html subscribers receive changed template blocks as events
+    named after the block (`sse-swap="content"`), JSON subscribers receive
+    `patch` events with the top level keys that were set or removed.
+    """
+
+    def __init__(self):
+        self.topics: Dict[str, Topic] = {}
+
+    def topic(self, name: str, template_name: str = "default_template.html") -> Topic:
+        if name not in self.topics:
+            self.topics[name] = Topic(name, template_name)
+        return self.topics[name]
+
+    def source(self, name: str, template_name: str = "default_template.html"):
+        """Register an async generator as the source of a topic."""
+
+        def decorator(func: Callable[[], AsyncIterator[Any]]):
+            self.topic(name, template_name).source = func
+            return func
+
+        return decorator
+
+    def publish(self, name: str, data: Any) -> None:
+        self.topic(name).publish(data)
+
+    def sse(self, request: Request, name: str):
+        """Stream a topic to the requester as Server-Sent Events."""
+        format_name = request.state.prefers.format
+        if format_name not in PUSH_FORMATS:
+            return PlainTextResponse(
+                content=f"{format_name} cannot be streamed",
+                status_code=406,
+            )
+        topic = self.topic(name)
+        request.state.bound_logger.info(
+            "streaming topic", topic=name, format=format_name
+        )
+
+        async def stream():
+            async for events in topic.events(
+                format_name, settings.push.heartbeat_seconds
+            ):
+                if events is None:
+                    yield ": keepalive\n\n"
+                    continue
+                yield "".join(sse_message(*event) for event in events)
+
+        return StreamingResponse(
+            stream(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    async def websocket(self, websocket: WebSocket, name: str) -> None:
+        """Push a topic over a WebSocket until the client disconnects."""
+        content_type = websocket.query_params.get("content_type", "")
+        format_name = "html" if ACCEPT_TYPES.get(content_type) == "html" else "JSON"
+        topic = self.topic(name)
+        await websocket.accept()
+
+        async def send():
+            async for events in topic.events(format_name):
+                await websocket.send_text(ws_message(format_name, events))
+
+        async def receive():
+            # only here to notice the disconnect, clients have nothing to say
+            while (await websocket.receive())["type"] != "websocket.disconnect":
+                pass
+
+        tasks = [asyncio.create_task(send()), asyncio.create_task(receive())]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {name: topic.stats() for name, topic in self.topics.items()}
+
+
+push_hub = PushHub()
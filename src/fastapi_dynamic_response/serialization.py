@@ -0,0 +1,164 @@
+import inspect
+import json
+from contextvars import ContextVar
+from functools import lru_cache
+from functools import wraps
+from typing import Any
+from typing import Callable
+from typing import Optional
+from typing import Tuple
+from typing import Union
+
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+
+from fastapi_dynamic_response.settings import settings
+
+
+def _stdlib_dumps(content: Any) -> bytes:
+    # matches starlette's JSONResponse.render byte for byte
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def get_engine(name: str) -> Tuple[Callable[[Any], bytes], Callable[[Any], Any]]:
+    """Return the (dumps, loads) pair for a JSON engine name."""
+    if name == "json":
+        return _stdlib_dumps, json.loads
+    if name == "orjson":
+        import orjson  # noqa: PLC0415 - optional, from the json extra
+
+        return orjson.dumps, orjson.loads
+    if name == "msgspec":
+        import msgspec  # noqa: PLC0415 - optional, from the json extra
+
+        encoder = msgspec.json.Encoder()
+        decoder = msgspec.json.Decoder()
+        return encoder.encode, decoder.decode
+    message = f"Unknown JSON engine {name}"
+    raise ValueError(message)
+
+
+@lru_cache
+def _configured_engine():
+    return get_engine(settings.JSON_ENGINE)
+
+
+def dumps(content: Any) -> bytes:
+    return _configured_engine()[0](content)
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    return _configured_engine()[1](data)
+
+
+class RouteContent:
+    """Receives the original route output for the dynamic response middleware.
+
+    Binary formats serialize the route's data directly, so when `skip_json`
+    is set the route's JSON body is never encoded at all.
+    """
+
+    __slots__ = ("captured", "content", "skip_json")
+
+    def __init__(self, *, skip_json: bool = False):
+        self.captured = False
+        self.content = None
+        self.skip_json = skip_json
+
+
+route_content: ContextVar[Optional[RouteContent]] = ContextVar(
+    "route_content", default=None
+)
+
+
+def encode_msgpack(content: Any) -> bytes:
+    import msgpack  # noqa: PLC0415 - optional, from the binary extra
+
+    try:
+        return msgpack.packb(content, use_bin_type=True)
+    except TypeError:
+        return msgpack.packb(jsonable_encoder(content), use_bin_type=True)
+
+
+def encode_cbor(content: Any) -> bytes:
+    import cbor2  # noqa: PLC0415 - optional, from the binary extra
+
+    try:
+        return cbor2.dumps(content)
+    except (TypeError, cbor2.CBOREncodeError):
+        return cbor2.dumps(jsonable_encoder(content))
+
+
+class DynamicJSONResponse(JSONResponse):
+    """JSONResponse rendered with the engine selected by `JSON_ENGINE`."""
+
+    def render(self, content: Any) -> bytes:
+        holder = route_content.get()
+        if holder is not None and not holder.captured:
+            holder.captured = True
+            holder.content = content
+            if holder.skip_json and str(self.status_code)[0] == "2":
+                return b""
+        try:
+            return dumps(content)
+        except TypeError:
+            # pydantic models, dataclasses and friends still go through
+            # FastAPI's encoder
+            return dumps(jsonable_encoder(content))
+
+
+class DynamicJSONRoute(APIRoute):
+    """APIRoute that hands route output straight to `DynamicJSONResponse`.
+
+    FastAPI runs `jsonable_encoder` over every return value before the
+    response class sees it, which costs several times more than the
+    encoding itself on large `data` lists. Routes without a response model,
+    a `Response` parameter or a bodyless status code return a
+    `DynamicJSONResponse` directly instead; anything the engine cannot
+    encode natively falls back to `jsonable_encoder` in `render`.
+    """
+
+    def get_route_handler(self):
+        response_class = getattr(self.response_class, "value", self.response_class)
+        if (
+            self.response_field is None
+            and self.dependant.response_param_name is None
+            and (self.status_code or 200) not in (204, 304)
+            and isinstance(response_class, type)
+            and issubclass(response_class, DynamicJSONResponse)
+        ):
+            self.dependant.call = self._direct_response(
+                self.dependant.call, response_class
+            )
+        return super().get_route_handler()
+
+    def _direct_response(self, call: Callable, response_class: type) -> Callable:
+        status_code = self.status_code or 200
+
+        if inspect.iscoroutinefunction(call):
+
+            @wraps(call)
+            async def wrapper(*args, **kwargs):
+                content = await call(*args, **kwargs)
+                if isinstance(content, Response):
+                    return content
+                return response_class(content, status_code=status_code)
+
+        else:
+
+            @wraps(call)
+            def wrapper(*args, **kwargs):
+                content = call(*args, **kwargs)
+                if isinstance(content, Response):
+                    return content
+                return response_class(content, status_code=status_code)
+
+        return wrapper
@@ -0,0 +1,89 @@
+import importlib
+import os
+import signal
+import time
+
+import structlog
+import uvicorn
+
+from fastapi_dynamic_response.settings import ApiServer
+
+logger = structlog.get_logger()
+
+
+def _serve(config: uvicorn.Config, sockets: list) -> None:
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, signal.SIG_DFL)
+    uvicorn.Server(config).run(sockets=sockets)
+
+
+class Preforker:
+    """Forks uvicorn workers over one socket and restarts the ones that crash."""
+
+    def __init__(self, config: uvicorn.Config, sock):
+        self.config = config
+        self.sock = sock
+        self.children = {}
+        self.stopping = False
+
+    def spawn(self) -> None:
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _serve(self.config, [self.sock])
+            finally:
+                os._exit(0)
+        self.children[pid] = time.monotonic()
+        logger.info("started worker", pid=pid)
+
+    def stop(self, _signum, _frame) -> None:
+        self.stopping = True
+        for pid in self.children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def supervise(self) -> None:
+        """Wait on the workers until every one of them has exited."""
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            started = self.children.pop(pid, None)
+            if started is None:
+                continue
+            logger.info("worker exited", pid=pid, status=status)
+            # restart crashed workers, but not ones that die right away
+            if not self.stopping and time.monotonic() - started > 1:
+                self.spawn()
+
+
+def run_preforked(api_server: ApiServer) -> None:
+    """Import the app once, warm its caches, then fork uvicorn workers.
+
+    uvicorn's own multiprocess mode spawns fresh interpreters that each
+    import and warm the app, this forks after the work is done so every
+    worker starts hot and shares the preloaded pages copy-on-write.
+    """
+    kwargs = api_server.uvicorn_kwargs()
+    workers = kwargs.pop("workers")
+    config = uvicorn.Config(**kwargs)
+    config.load()
+
+    module = importlib.import_module(api_server.app.split(":")[0])
+    preload = getattr(module, "preload", None)
+    if preload is not None:
+        preload()
+
+    sock = config.bind_socket()
+    preforker = Preforker(config, sock)
+    signal.signal(signal.SIGINT, preforker.stop)
+    signal.signal(signal.SIGTERM, preforker.stop)
+    for _ in range(workers):
+        preforker.spawn()
+    preforker.supervise()
+    sock.close()
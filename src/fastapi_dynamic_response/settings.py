@@ -1,3 +1,7 @@
+import math
+import os
+from typing import Dict, List, Literal, Optional, Union
+
 from pydantic import BaseModel, model_validator
 from pydantic_settings import BaseSettings
 
@@ -5,21 +9,176 @@ from pydantic_settings import BaseSettings
 class ApiServer(BaseModel):
     app: str = "fastapi_dynamic_response.main:app"
     port: int = 8000
-    reload: bool = True
+    # defaults to True only when ENV is local
+    reload: Optional[bool] = None
     log_level: str = "info"
     host: str = "0.0.0.0"
-    workers: int = 1
+    # "auto" sizes the pool from the container's CPU quota
+    workers: Union[int, Literal["auto"]] = 1
     forwarded_allow_ips: str = "*"
     proxy_headers: bool = True
+    loop: Literal["auto", "asyncio", "uvloop"] = "auto"
+    http: Literal["auto", "h11", "httptools"] = "auto"
+    timeout_keep_alive: int = 5
+    backlog: int = 2048
+    limit_concurrency: Optional[int] = None
+    # import the app and build its caches once, then fork the workers
+    preload: bool = False
+
+    def worker_count(self) -> int:
+        if self.workers == "auto":
+            return max(1, math.ceil(available_cpus()))
+        return self.workers
+
+    def uvicorn_kwargs(self) -> dict:
+        kwargs = self.model_dump(exclude={"preload"})
+        kwargs["workers"] = self.worker_count()
+        return kwargs
+
+
+def available_cpus() -> float:
+    """CPUs this process may use, honoring cgroup v2/v1 CPU quotas."""
+    try:
+        cpus = float(len(os.sched_getaffinity(0)))
+    except AttributeError:
+        cpus = float(os.cpu_count() or 1)
+
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            return min(cpus, int(quota) / int(period))
+    except (OSError, ValueError):
+        pass
+
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        if quota > 0 and period > 0:
+            return min(cpus, quota / period)
+    except (OSError, ValueError):
+        pass
+
+    return cpus
+
+
+class Compression(BaseModel):
+    enabled: bool = True
+    minimum_size: int = 500
+    encodings: List[str] = ["br", "zstd", "gzip"]
+    gzip_level: int = 6
+    brotli_quality: int = 5
+    zstd_level: int = 3
+    content_types: List[str] = [
+        "text/html",
+        "text/plain",
+        "text/markdown",
+        "text/css",
+        "application/json",
+        "application/javascript",
+        "image/svg+xml",
+    ]
+    cache_size: int = 512
+    static_max_age: int = 31536000
+
+
+class Overload(BaseModel):
+    enabled: bool = True
+    # seconds of estimated outstanding work (in-flight x recent latency)
+    # a worker takes on before it is at full pressure
+    budget_seconds: float = 8.0
+    # how long full pressure has to last before /readyz fails
+    sustained_seconds: float = 10.0
+    # weight of the newest sample in the per-format latency average
+    latency_alpha: float = 0.2
+    # pressure at which each format starts being shed, formats that are not
+    # listed (JSON, msgpack, cbor, ...) are never shed
+    shed_at: Dict[str, float] = {
+        "png": 0.5,
+        "pdf": 0.5,
+        "rtf": 0.75,
+        "html": 1.0,
+        "markdown": 1.0,
+        "text": 1.0,
+    }
+    # latency assumed for a format before it has been measured
+    initial_latency: Dict[str, float] = {
+        "png": 1.0,
+        "pdf": 1.0,
+        "rtf": 0.1,
+    }
+    default_latency: float = 0.02
+
+
+class RenderCache(BaseModel):
+    enabled: bool = True
+    # a tmpfs path so every worker on the node maps the same pages
+    path: str = "/dev/shm/fastapi-dynamic-response-render-cache"  # noqa: S108
+    # 64 x 256KiB is about 16MiB, well inside the 64MiB /dev/shm docker gives
+    # a container by default, writing past a full tmpfs kills the worker
+    slots: int = 64
+    slot_size: int = 256 * 1024
+    ways: int = 8
+    formats: List[str] = ["html", "markdown", "text", "rtf", "png", "pdf"]
+
+
+class Images(BaseModel):
+    # threads capturing and encoding screenshots off the event loop
+    workers: int = 2
+    quality: int = 80
+    default_width: int = 1280
+    default_height: int = 1024
+    max_width: int = 3840
+    # full page captures are cut off here
+    max_height: int = 16384
+    max_scale: float = 3.0
+    max_thumbnail: int = 1024
+
+
+class Push(BaseModel):
+    # updates buffered per subscriber before it is resynced with a snapshot
+    queue_size: int = 16
+    # idle SSE streams get a comment this often to keep proxies from closing them
+    heartbeat_seconds: float = 15.0
+
+
+# only good enough for local development, see validate_session_secret_key
+DEFAULT_SESSION_SECRET_KEY = "your-secret-key"  # noqa: S105
 
 
 class Settings(BaseSettings):
     ENV: str = "local"
     DEBUG: bool = False
+    JSON_ENGINE: Literal["json", "orjson", "msgspec"] = "json"
+    ARROW_BATCH_SIZE: int = 65536
+    AUTH_CACHE_TTL: float = 60.0
+    AUTH_CACHE_SIZE: int = 1024
+    # rejected Authorization headers, kept apart so they cannot evict logins
+    AUTH_FAILURE_CACHE_SIZE: int = 256
+    SINGLE_FLIGHT: bool = True
+    # skip rich tracebacks and console logging even when ENV is local
+    FAST_STARTUP: bool = False
+    # formats whose renderer dependencies are imported at startup
+    PREWARM_FORMATS: List[str] = []
+    # signs session cookies for routes marked with uses_session, required in
+    # config.env or the environment outside of local development
+    SESSION_SECRET_KEY: str = DEFAULT_SESSION_SECRET_KEY
+    # template block rendered for htmx requests, HX-Target overrides it when
+    # it names a block of the template
+    FRAGMENT_BLOCK: str = "content"
+    FRAGMENT_CACHE_SIZE: int = 1024
     api_server: ApiServer = ApiServer()
+    compression: Compression = Compression()
+    overload: Overload = Overload()
+    render_cache: RenderCache = RenderCache()
+    push: Push = Push()
+    images: Images = Images()
 
     class Config:
         env_file = "config.env"
+        env_nested_delimiter = "__"
 
     @model_validator(mode="after")
     def validate_debug(self):
@@ -27,5 +186,19 @@ class Settings(BaseSettings):
             self.DEBUG = True
         return self
 
+    @model_validator(mode="after")
+    def validate_reload(self):
+        if self.api_server.reload is None:
+            self.api_server.reload = self.ENV == "local"
+        return self
+
+    @model_validator(mode="after")
+    def validate_session_secret_key(self):
+        default = self.SESSION_SECRET_KEY == DEFAULT_SESSION_SECRET_KEY
+        if self.ENV != "local" and default:
+            message = f"SESSION_SECRET_KEY must be set when ENV is {self.ENV}"
+            raise ValueError(message)
+        return self
+
 
 settings = Settings()
@@ -0,0 +1,211 @@
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import time
+from pathlib import Path
+from typing import Callable
+from typing import Optional
+from typing import Tuple
+from typing import Union
+
+import structlog
+
+from fastapi_dynamic_response.settings import RenderCache
+
+logger = structlog.get_logger()
+
+MAGIC = b"FDRCACHE"
+VERSION = 2
+# magic, version, slots, slot_size, ways, build
+HEADER = struct.Struct("<8sIIII16s")
+HEADER_SIZE = 64
+# key digest, generation, body length, content type length, last used (wall clock)
+ENTRY = struct.Struct("<16sIIHd")
+ENTRY_SIZE = 48
+EMPTY_KEY = b"\0" * 16
+
+
+def cache_key(*parts) -> bytes:
+    """Digest render inputs into a fixed size key, bytes parts are hashed raw."""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        data = part if isinstance(part, bytes) else repr(part).encode("utf-8")
+        digest.update(len(data).to_bytes(8, "little"))
+        digest.update(data)
+    return digest.digest()
+
+
+def source_digest(*directories: str) -> bytes:
+    """Digest the paths and contents of every file below `directories`."""
+    digest = hashlib.blake2b(digest_size=16)
+    for directory in directories:
+        root = Path(directory)
+        for path in sorted(root.rglob("*")):
+            if path.is_file():
+                digest.update(str(path.relative_to(root)).encode("utf-8"))
+                digest.update(path.read_bytes())
+    return digest.digest()
+
+
+class SharedRenderCache:
+    """Render cache shared by every worker on a node through a mmapped file.
+
+    The file holds a fixed index followed by `slots` data slots of
+    `slot_size` bytes. Keys hash to a set of `ways` neighbouring slots and
+    the least recently used slot in the set is evicted (set associative LRU).
+    Writers take an exclusive flock; readers a shared one.
+
+    `get` copies the body out while holding the lock, a slot can be
+    overwritten by another worker as soon as the lock is released.
+
+    `build` identifies what produced the renders (app version, templates,
+    static files). A file written by a different build is reset on open,
+    so a deploy never serves the previous release's pages. It can be a
+    function, which is only called when the cache is first used.
+    """
+
+    def __init__(
+        self,
+        config: RenderCache,
+        build: Union[bytes, Callable[[], bytes]] = EMPTY_KEY,
+    ):
+        self.config = config
+        self._build = build
+        self.slots = config.slots
+        self.slot_size = config.slot_size
+        self.ways = min(config.ways, config.slots)
+        self.data_offset = HEADER_SIZE + ENTRY_SIZE * self.slots
+        self.size = self.data_offset + self.slots * self.slot_size
+        self.pid = None
+        self.fd = None
+        self.mm = None
+        self.disabled = not config.enabled
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.skipped = 0
+
+    @property
+    def build(self) -> bytes:
+        if callable(self._build):
+            self._build = self._build()
+        return self._build
+
+    def _open(self) -> bool:
+        if self.disabled:
+            return False
+        if self.pid == os.getpid():
+            return True
+        # flock is per open file description, so every forked worker needs
+        # its own descriptor for the locks to exclude each other
+        try:
+            fd = os.open(self.config.path, os.O_RDWR | os.O_CREAT, 0o600)
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(fd).st_size != self.size or not self._valid_header(fd):
+                    os.ftruncate(fd, 0)
+                    os.ftruncate(fd, self.size)
+                    os.pwrite(fd, self._header(), 0)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            mm = mmap.mmap(fd, self.size, mmap.MAP_SHARED)
+        except OSError as e:
+            logger.warning("render cache disabled", path=self.config.path, error=str(e))
+            self.disabled = True
+            return False
+        self.fd, self.mm, self.pid = fd, mm, os.getpid()
+        return True
+
+    def _header(self) -> bytes:
+        return HEADER.pack(
+            MAGIC, VERSION, self.slots, self.slot_size, self.ways, self.build
+        )
+
+    def _valid_header(self, fd: int) -> bool:
+        return os.pread(fd, HEADER.size, 0) == self._header()
+
+    def _entry(self, slot: int):
+        return ENTRY.unpack_from(self.mm, HEADER_SIZE + slot * ENTRY_SIZE)
+
+    def _set_entry(self, slot: int, *entry) -> None:
+        ENTRY.pack_into(self.mm, HEADER_SIZE + slot * ENTRY_SIZE, *entry)
+
+    def _candidates(self, key: bytes) -> list:
+        first = int.from_bytes(key[:4], "little") % self.slots
+        return [(first + way) % self.slots for way in range(self.ways)]
+
+    def get(self, key: bytes) -> Optional[Tuple[bytes, str]]:
+        if not self._open():
+            return None
+        fcntl.flock(self.fd, fcntl.LOCK_SH)
+        try:
+            for slot in self._candidates(key):
+                entry_key, generation, length, type_length, _ = self._entry(slot)
+                if entry_key != key:
+                    continue
+                start = self.data_offset + slot * self.slot_size
+                content_type = bytes(self.mm[start : start + type_length]).decode()
+                body = self.mm[start + type_length : start + type_length + length]
+                # a racy write of the timestamp is fine, it is only a hint
+                self._set_entry(
+                    slot, entry_key, generation, length, type_length, time.time()
+                )
+                self.hits += 1
+                return body, content_type
+        finally:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+        self.misses += 1
+        return None
+
+    def set(self, key: bytes, body: bytes, content_type: str) -> bool:
+        if not self._open():
+            return False
+        content_type_bytes = content_type.encode()
+        if len(body) + len(content_type_bytes) > self.slot_size:
+            self.skipped += 1
+            return False
+
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        try:
+            now = time.time()
+            entries = [(slot, self._entry(slot)) for slot in self._candidates(key)]
+            if any(entry[0] == key for _, entry in entries):
+                # another worker stored the same render first
+                return True
+            victim = None
+            victim_entry = None
+            for slot, entry in entries:
+                if entry[0] == EMPTY_KEY:
+                    victim, victim_entry = slot, entry
+                    break
+                if victim is None or entry[4] < victim_entry[4]:
+                    victim, victim_entry = slot, entry
+            generation = (victim_entry[1] + 1) & 0xFFFFFFFF
+            # invalidate before writing so readers never match a half
+            # written slot
+            self._set_entry(victim, EMPTY_KEY, generation, 0, 0, now)
+            start = self.data_offset + victim * self.slot_size
+            self.mm[start : start + len(content_type_bytes)] = content_type_bytes
+            start += len(content_type_bytes)
+            self.mm[start : start + len(body)] = body
+            self._set_entry(
+                victim, key, generation, len(body), len(content_type_bytes), now
+            )
+            self.stores += 1
+            return True
+        finally:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": not self.disabled,
+            "path": self.config.path,
+            "slots": self.slots,
+            "slot_size": self.slot_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "skipped": self.skipped,
+        }
@@ -1,8 +1,28 @@
-from fastapi import APIRouter, HTTPException, Request
+import asyncio
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import PlainTextResponse
 
 from fastapi_dynamic_response import globals
+from fastapi_dynamic_response.auth import has_scope
+from fastapi_dynamic_response.fragments import fragment_cache
+from fastapi_dynamic_response.middleware import (
+    override_prefers,
+    render_cache,
+    render_flights,
+)
+from fastapi_dynamic_response.overload import overload
+from fastapi_dynamic_response.profiler import (
+    collapsed,
+    heap_diff,
+    run_exclusive,
+    sample_stacks,
+)
+from fastapi_dynamic_response.push import push_hub
+from fastapi_dynamic_response.serialization import DynamicJSONRoute
 
-router = APIRouter()
+router = APIRouter(route_class=DynamicJSONRoute)
 
 
 @router.get("/livez")
@@ -20,13 +40,15 @@ async def readyz(request: Request):
     """
     Readiness probe endpoint.
     Returns 200 OK if the application is ready to receive traffic.
-    Returns 503 Service Unavailable if not ready.
+    Returns 503 Service Unavailable if not ready or overloaded for longer
+    than `overload.sustained_seconds`, so k8s stops routing to this pod.
     """
     request.state.template_name = "status.html"
-    if globals.is_ready:
-        return {"status": "ready"}
-    else:
+    if not globals.is_ready:
         raise HTTPException(status_code=503, detail="Not ready")
+    if overload.sustained_overload():
+        raise HTTPException(status_code=503, detail="Overloaded")
+    return {"status": "ready"}
 
 
 @router.get("/healthz")
@@ -41,3 +63,85 @@ async def healthz(request: Request):
         return {"status": "healthy"}
     else:
         raise HTTPException(status_code=503, detail="Unhealthy")
+
+
+@router.get("/varz")
+async def varz(request: Request):
+    """
+    Process counters for the dynamic response pipeline.
+    """
+    request.state.template_name = "varz.html"
+    return {
+        "singleflight": render_flights.stats(),
+        "overload": overload.stats(),
+        "render_cache": render_cache.stats(),
+        "fragment_cache": fragment_cache.stats(),
+        "push": push_hub.stats(),
+    }
+
+
+@router.get("/debug/profile")
+@has_scope("superuser")
+async def debug_profile(
+    request: Request,
+    seconds: float = Query(5.0, gt=0, le=60),
+    interval: float = Query(0.005, ge=0.001, le=1),
+    output: Optional[str] = Query(
+        None,
+        alias="format",
+        description="svg, collapsed or any dynamic response format, "
+        "overrides content negotiation",
+    ),
+):
+    """
+    Sample the stacks of every thread in this worker for `seconds`.
+    Returns a flamegraph (html, svg), collapsed stacks or the raw counts.
+    """
+    stacks = await asyncio.to_thread(run_exclusive, sample_stacks, seconds, interval)
+    if stacks is None:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+
+    if output == "collapsed":
+        request.state.raw_response = True
+        return PlainTextResponse(collapsed(stacks))
+    if output == "svg":
+        request.state.raw_response = True
+        svg = globals.templates.get_template("flamegraph.svg").render(
+            data={"stacks": stacks}
+        )
+        return Response(content=svg, media_type="image/svg+xml")
+    if output is not None:
+        override_prefers(request, output)
+
+    request.state.template_name = "flamegraph.html"
+    return {
+        "seconds": seconds,
+        "interval": interval,
+        "samples": sum(stacks.values()),
+        "stacks": dict(stacks.most_common()),
+    }
+
+
+@router.get("/debug/heap")
+@has_scope("superuser")
+async def debug_heap(
+    request: Request,
+    seconds: float = Query(5.0, ge=0, le=60),
+    limit: int = Query(25, ge=1, le=500),
+    output: Optional[str] = Query(
+        None,
+        alias="format",
+        description="Any dynamic response format, overrides negotiation",
+    ),
+):
+    """
+    Diff tracemalloc snapshots taken `seconds` apart, largest growth first.
+    """
+    diff = await asyncio.to_thread(run_exclusive, heap_diff, seconds, limit)
+    if diff is None:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    if output is not None:
+        override_prefers(request, output)
+
+    request.state.template_name = "heap.html"
+    return diff
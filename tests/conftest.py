@@ -0,0 +1,4 @@
+import os
+
+# keep the tests off the node wide /dev/shm render cache
+os.environ.setdefault("RENDER_CACHE__ENABLED", "false")
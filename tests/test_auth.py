@@ -0,0 +1,106 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from fastapi_dynamic_response.auth import AUTH_DB
+from fastapi_dynamic_response.auth import BasicAuthBackend
+from fastapi_dynamic_response.auth import CredentialStore
+from fastapi_dynamic_response.auth import hash_password
+from fastapi_dynamic_response.auth import verify_password
+
+
+class CountingStore(CredentialStore):
+    """Plaintext store that records where and how often it verified."""
+
+    def __init__(self):
+        self.calls = 0
+        self.threads = set()
+
+    def verify(self, username, password):
+        self.calls += 1
+        self.threads.add(threading.get_ident())
+        if (username, password) == ("user1", "password123"):
+            return frozenset({"authenticated"})
+        return None
+
+
+def make_request(authorization):
+    return Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "path": "/private",
+            "query_string": b"",
+            "headers": [(b"authorization", authorization.encode())],
+        }
+    )
+
+
+def authenticate(backend, authorization):
+    return asyncio.run(backend.authenticate(make_request(authorization)))
+
+
+def test_hash_and_verify_password():
+    encoded = hash_password("hunter2", salt=b"\0" * 16)
+    assert encoded.startswith("pbkdf2_sha256$200000$")
+    assert verify_password("hunter2", encoded)
+    assert not verify_password("hunter3", encoded)
+
+
+def test_demo_users_verify():
+    assert verify_password("password123", AUTH_DB["user1"])
+
+
+def test_valid_credentials_are_cached():
+    store = CountingStore()
+    backend = BasicAuthBackend(store=store, cache_ttl=60)
+
+    for _ in range(3):
+        credentials, user = authenticate(backend, "Basic user1:password123")
+        assert user.display_name == "user1"
+        assert "authenticated" in credentials.scopes
+    assert store.calls == 1
+
+
+def test_verify_runs_off_the_event_loop():
+    store = CountingStore()
+    authenticate(BasicAuthBackend(store=store), "Basic user1:password123")
+    assert threading.get_ident() not in store.threads
+
+
+def test_rejected_credentials_are_cached_apart():
+    store = CountingStore()
+    backend = BasicAuthBackend(
+        store=store, cache_ttl=60, cache_size=4, failure_cache_size=2
+    )
+    authenticate(backend, "Basic user1:password123")
+
+    for attempt in range(5):
+        with pytest.raises(HTTPException) as error:
+            authenticate(backend, f"Basic user1:wrong{attempt}")
+        assert error.value.status_code == 401
+    with pytest.raises(HTTPException):
+        authenticate(backend, "Basic user1:wrong4")
+
+    assert len(backend.failures) == 2
+    assert store.calls == 6
+    # the valid login was not evicted by the failures
+    authenticate(backend, "Basic user1:password123")
+    assert store.calls == 6
+
+
+def test_other_schemes_skip_the_caches():
+    store = CountingStore()
+    backend = BasicAuthBackend(store=store, cache_ttl=60, cache_size=1)
+    authenticate(backend, "Basic user1:password123")
+
+    for attempt in range(3):
+        assert authenticate(backend, f"Bearer token{attempt}") is None
+    assert len(backend.cache) == 1
+    assert len(backend.failures) == 0
+    # the cached login is still there
+    authenticate(backend, "Basic user1:password123")
+    assert store.calls == 1
@@ -0,0 +1,36 @@
+from fastapi_dynamic_response import cache as cache_module
+from fastapi_dynamic_response.cache import LRUCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+def test_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert "a" in cache
+    assert "b" not in cache
+    assert cache.get("c") == 3
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module, "time", clock)
+    cache = LRUCache(maxsize=2, ttl=10)
+    cache.set("a", 1)
+
+    clock.now += 9
+    assert "a" in cache
+    assert cache.get("a") == 1
+
+    clock.now += 2
+    assert "a" not in cache
+    assert cache.get("a") is None
@@ -0,0 +1,65 @@
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from starlette.testclient import TestClient
+
+from fastapi_dynamic_response.compression import PrecompressedStaticFiles
+from fastapi_dynamic_response.compression import negotiate_encoding
+from fastapi_dynamic_response.compression import parse_accept_encoding
+
+CSS = b"body { color: teal; }\n" * 200
+
+
+def static_client(tmp_path):
+    (tmp_path / "app.css").write_bytes(CSS)
+    app = Starlette(
+        routes=[
+            Mount("/static", PrecompressedStaticFiles(directory=tmp_path)),
+        ]
+    )
+    return TestClient(app)
+
+
+def test_parse_accept_encoding():
+    assert parse_accept_encoding("gzip;q=0, BR;q=0.5, zstd") == {
+        "gzip": 0.0,
+        "br": 0.5,
+        "zstd": 1.0,
+    }
+
+
+def test_negotiate_encoding_falls_back_to_gzip():
+    assert negotiate_encoding("gzip, deflate") == "gzip"
+    assert negotiate_encoding("identity") is None
+    assert negotiate_encoding("gzip;q=0") is None
+
+
+def test_static_gzip_variant(tmp_path):
+    client = static_client(tmp_path)
+    response = client.get("/static/app.css", headers={"accept-encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"].endswith('-gzip"')
+    assert "immutable" in response.headers["cache-control"]
+    assert int(response.headers["content-length"]) < len(CSS)
+    # httpx decodes the body
+    assert response.content == CSS
+
+
+def test_static_variant_etag_not_modified(tmp_path):
+    client = static_client(tmp_path)
+    headers = {"accept-encoding": "gzip"}
+    etag = client.get("/static/app.css", headers=headers).headers["etag"]
+
+    response = client.get("/static/app.css", headers={**headers, "if-none-match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert not response.content
+
+
+def test_static_identity_etag_not_modified(tmp_path):
+    client = static_client(tmp_path)
+    headers = {"accept-encoding": "identity"}
+    etag = client.get("/static/app.css", headers=headers).headers["etag"]
+
+    response = client.get("/static/app.css", headers={**headers, "if-none-match": etag})
+    assert response.status_code == 304
@@ -0,0 +1,55 @@
+import pytest
+from starlette.testclient import TestClient
+
+from fastapi_dynamic_response.fastpath import PROBE
+from fastapi_dynamic_response.fastpath import SESSION
+from fastapi_dynamic_response.fastpath import STATELESS
+from fastapi_dynamic_response.fastpath import STATIC
+from fastapi_dynamic_response.main import app
+from fastapi_dynamic_response.main import route_classifier
+
+JSON = {"accept": "application/json"}
+
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+
+def test_routes_are_classified():
+    kinds = route_classifier.classify()
+    assert kinds["/livez"] == PROBE
+    assert kinds["/readyz"] == PROBE
+    assert kinds["/static"] == STATIC
+    assert kinds["/visits"] == SESSION
+    assert kinds["/example"] == STATELESS
+
+
+def test_only_probes_and_static_files_are_fast():
+    assert route_classifier.is_fast("/livez")
+    assert route_classifier.is_fast("/static/app.css")
+    assert not route_classifier.is_fast("/example")
+    assert not route_classifier.is_fast("/visits")
+
+
+def test_probes_skip_the_middleware_stack(client):
+    # authentication would reject these credentials
+    response = client.get("/livez", headers={"authorization": "Basic user1:wrong"})
+    assert response.status_code == 200
+    assert "x-process-time" not in response.headers
+
+
+def test_session_routes_set_the_cookie(client):
+    response = client.get("/visits", headers=JSON)
+    assert "session" in response.cookies
+    assert "1 times" in response.json()["message"]
+
+    response = client.get("/visits", headers=JSON)
+    assert "2 times" in response.json()["message"]
+
+
+def test_other_routes_leave_the_session_alone(client):
+    client.get("/visits", headers=JSON)
+    response = client.get("/example", headers=JSON)
+    assert response.status_code == 200
+    assert "set-cookie" not in response.headers
@@ -0,0 +1,98 @@
+from io import BytesIO
+
+import pytest
+from PIL import Image
+from starlette.requests import Request
+from starlette.testclient import TestClient
+
+from fastapi_dynamic_response.images import ImageOptions
+from fastapi_dynamic_response.images import encode_image
+from fastapi_dynamic_response.main import app
+from fastapi_dynamic_response.settings import settings
+
+
+def options_for(query="", content_type="image/png", headers=None):
+    raw_headers = [
+        (name.encode(), value.encode()) for name, value in (headers or {}).items()
+    ]
+    request = Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "path": "/example",
+            "query_string": query.encode(),
+            "headers": raw_headers,
+            "state": {"content_type": content_type},
+        }
+    )
+    return ImageOptions.from_request(request)
+
+
+def test_defaults_come_from_settings():
+    options = options_for()
+    assert options.width == settings.images.default_width
+    assert options.height == settings.images.default_height
+    assert options.scale == 1.0
+    assert options.format == "png"
+    assert options.quality == settings.images.quality
+    assert not options.full_page
+    assert options.thumbnail is None
+
+
+def test_query_parameters_are_read():
+    options = options_for(
+        "width=800&height=600&scale=2&format=jpg&quality=50"
+        "&full_page=true&thumbnail=200"
+    )
+    assert (options.width, options.height, options.scale) == (800, 600, 2.0)
+    assert options.format == "jpeg"
+    assert options.media_type == "image/jpeg"
+    assert options.quality == 50
+    assert options.full_page
+    assert options.thumbnail == 200
+
+
+def test_format_falls_back_to_the_negotiated_type():
+    assert options_for(content_type="image/webp").format == "webp"
+    assert options_for(content_type="application/json").format == "png"
+
+
+def test_scale_header_wins_over_the_query():
+    assert options_for("scale=2", headers={"scale": "1.5"}).scale == 1.5
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "width=0",
+        "width=-10",
+        f"width={settings.images.max_width + 1}",
+        f"height={settings.images.max_height + 1}",
+        f"scale={settings.images.max_scale + 1}",
+        "quality=101",
+        f"thumbnail={settings.images.max_thumbnail + 1}",
+        "width=wide",
+        "format=gif",
+    ],
+)
+def test_bad_options_are_rejected(query):
+    with pytest.raises(ValueError):
+        options_for(query)
+
+
+def test_bad_options_are_a_400():
+    client = TestClient(app)
+    response = client.get("/example?content-type=png&width=0")
+    assert response.status_code == 400
+    assert "out of range" in response.text
+
+
+def test_encode_image_resizes_and_converts():
+    buffer = BytesIO()
+    Image.new("RGBA", (400, 200), "teal").save(buffer, format="PNG")
+    options = options_for("format=jpeg&thumbnail=100")
+
+    body = encode_image(buffer.getvalue(), options)
+    with Image.open(BytesIO(body)) as image:
+        assert image.format == "JPEG"
+        assert image.size == (100, 50)
@@ -0,0 +1,139 @@
+from collections import Counter
+
+import pytest
+from starlette.requests import Request
+from starlette.testclient import TestClient
+
+from fastapi_dynamic_response import overload as overload_module
+from fastapi_dynamic_response.main import app
+from fastapi_dynamic_response.middleware import counts_toward_overload
+from fastapi_dynamic_response.overload import OverloadController
+from fastapi_dynamic_response.overload import overload
+from fastapi_dynamic_response.settings import Overload
+
+
+def make_request(path, headers=None):
+    raw_headers = [
+        (name.encode(), value.encode()) for name, value in (headers or {}).items()
+    ]
+    return Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "path": path,
+            "query_string": b"",
+            "headers": raw_headers,
+        }
+    )
+
+
+def test_first_sample_is_averaged_with_the_default_latency():
+    controller = OverloadController(Overload(default_latency=0.02, latency_alpha=0.2))
+    assert controller.admit("html")
+    controller.finish("html", 5.0)
+    assert controller.latency["html"] == pytest.approx(0.2 * 5.0 + 0.8 * 0.02)
+
+
+def test_debug_and_streams_are_not_accounted():
+    assert counts_toward_overload(make_request("/example"))
+    assert not counts_toward_overload(make_request("/debug/profile"))
+    assert not counts_toward_overload(make_request("/debug/heap"))
+    assert not counts_toward_overload(make_request("/livez"))
+    assert not counts_toward_overload(make_request("/static/app.css"))
+    assert not counts_toward_overload(
+        make_request("/example/stream", headers={"accept": "text/event-stream"})
+    )
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+def busy_controller(monkeypatch, **options):
+    clock = Clock()
+    monkeypatch.setattr(overload_module, "time", clock)
+    config = Overload(
+        budget_seconds=4.0,
+        sustained_seconds=10.0,
+        shed_at={"pdf": 0.5, "html": 1.0},
+        initial_latency={"pdf": 1.0},
+        **options,
+    )
+    return OverloadController(config), clock
+
+
+def test_expensive_formats_are_shed_first(monkeypatch):
+    controller, _ = busy_controller(monkeypatch)
+    assert controller.admit("pdf")
+    assert controller.admit("pdf")
+    # two pdfs in flight are 2s of a 4s budget
+    assert controller.pressure() == 0.5
+    assert not controller.admit("pdf")
+    assert controller.admit("html")
+    # formats without a threshold are never shed
+    for _ in range(10):
+        assert controller.admit("JSON")
+
+    stats = controller.stats()
+    assert stats["shed"] == {"pdf": 1}
+    assert stats["in_flight"] == {"pdf": 2, "html": 1, "JSON": 10}
+
+
+def test_finish_frees_capacity(monkeypatch):
+    controller, _ = busy_controller(monkeypatch)
+    controller.admit("pdf")
+    controller.admit("pdf")
+    assert not controller.admit("pdf")
+    controller.finish("pdf", 1.0)
+    assert controller.admit("pdf")
+
+
+def test_disabled_controller_admits_everything(monkeypatch):
+    controller, _ = busy_controller(monkeypatch, enabled=False)
+    for _ in range(10):
+        assert controller.admit("pdf")
+    assert not controller.sustained_overload()
+
+
+def test_retry_after_is_the_outstanding_work(monkeypatch):
+    controller, _ = busy_controller(monkeypatch)
+    assert controller.retry_after() == 1
+    controller.admit("pdf")
+    controller.admit("pdf")
+    controller.latency["pdf"] = 1.2
+    assert controller.retry_after() == 3
+
+
+def test_overload_has_to_last_to_be_sustained(monkeypatch):
+    controller, clock = busy_controller(monkeypatch)
+    for _ in range(4):
+        controller.admit("html")
+    controller.latency["html"] = 1.0
+    assert controller.pressure() == 1.0
+    assert not controller.sustained_overload()
+
+    clock.now += 10
+    assert controller.sustained_overload()
+
+    controller.finish("html", 1.0)
+    assert not controller.sustained_overload()
+
+
+def test_readyz_fails_under_sustained_overload(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(overload_module, "time", clock)
+    monkeypatch.setattr(overload, "in_flight", Counter({"pdf": 100}))
+    monkeypatch.setattr(overload, "overloaded_since", None)
+    with TestClient(app) as client:
+        assert client.get("/readyz").status_code == 200
+
+        clock.now += overload.config.sustained_seconds
+        response = client.get("/readyz")
+        assert response.status_code == 503
+
+        overload.in_flight.clear()
+        assert client.get("/readyz").status_code == 200
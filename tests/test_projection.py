@@ -0,0 +1,103 @@
+import base64
+import re
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+from starlette.testclient import TestClient
+
+from fastapi_dynamic_response.main import app
+from fastapi_dynamic_response.projection import decode_cursor
+from fastapi_dynamic_response.projection import encode_cursor
+from fastapi_dynamic_response.projection import next_page_query
+from fastapi_dynamic_response.projection import paginate
+from fastapi_dynamic_response.projection import parse_fields
+from fastapi_dynamic_response.projection import project
+
+JSON = {"accept": "application/json"}
+
+
+@pytest.fixture(scope="module")
+def client():
+    return TestClient(app)
+
+
+def test_project_keeps_requested_paths():
+    tree = parse_fields("message,data.id")
+    content = {"message": "hi", "other": 1, "data": [{"id": 1, "name": "a"}]}
+    assert project(content, tree) == {"message": "hi", "data": [{"id": 1}]}
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(20, 10), max_limit=100) == (20, 10)
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "not a cursor",
+        encode_cursor(-1, 10),
+        encode_cursor(0, 0),
+        encode_cursor(0, -5),
+        encode_cursor(0, 10**9),
+        base64.urlsafe_b64encode(b"[true,true]").decode(),
+    ],
+)
+def test_crafted_cursors_are_rejected(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor, max_limit=100)
+    assert error.value.status_code == 400
+
+
+def test_paginate_pages_through_items():
+    content = {"items": list(range(5))}
+    page = paginate(content, "items", {"cursor": None, "limit": 2}, None, 100)
+    assert page["items"] == [0, 1]
+
+    for expected in ([2, 3], [4]):
+        projection = {"cursor": page["next_cursor"], "limit": None}
+        page = paginate(content, "items", projection, None, 100)
+        assert page["items"] == expected
+    assert page["items"] == [4]
+    assert page["next_cursor"] is None
+
+
+def test_route_uses_the_projection_dependency(client):
+    response = client.get("/example?limit=3&fields=data", headers=JSON)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["data"] == [1, 2, 3]
+    assert set(body) == {"data", "next_cursor"}
+
+    response = client.get(f"/example?cursor={body['next_cursor']}", headers=JSON)
+    assert response.json()["data"] == [4]
+
+
+def test_route_rejects_bad_limits(client):
+    assert client.get("/example?limit=0", headers=JSON).status_code == 422
+    cursor = encode_cursor(0, 0)
+    assert client.get(f"/example?cursor={cursor}", headers=JSON).status_code == 400
+
+
+def test_next_page_query_keeps_other_parameters():
+    request = Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "path": "/example",
+            "query_string": b"fields=data&content-type=html&cursor=old",
+            "headers": [],
+            "server": ("testserver", 80),
+        }
+    )
+    assert next_page_query("new", request) == (
+        "fields=data&content-type=html&cursor=new"
+    )
+    assert next_page_query("new") == "cursor=new"
+
+
+def test_next_page_link_keeps_the_projection(client):
+    response = client.get("/example?limit=2&fields=data&content-type=html")
+    assert response.status_code == 200
+    link = re.search(r'href="\?([^"]+)">Next page', response.text).group(1)
+    assert link.startswith("limit=2&amp;fields=data&amp;content-type=html&amp;cursor=")
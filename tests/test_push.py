@@ -0,0 +1,96 @@
+import asyncio
+import json
+
+import pytest
+from starlette.testclient import TestClient
+
+from fastapi_dynamic_response.main import app
+from fastapi_dynamic_response.push import Topic
+from fastapi_dynamic_response.push import diff_events
+
+
+@pytest.fixture(scope="module")
+def client():
+    return TestClient(app)
+
+
+def patch(events):
+    [(name, payload)] = events
+    assert name == "patch"
+    return json.loads(payload)
+
+
+def test_json_diff_sets_changed_and_unsets_removed_keys():
+    old = {"a": "1", "b": "2", "c": "3"}
+    new = {"a": "1", "b": "20"}
+    events = diff_events("JSON", old, new, {"a": 1, "b": 20})
+    assert patch(events) == {"set": {"b": 20}, "unset": ["c"]}
+
+
+def test_unchanged_json_sends_nothing():
+    parts = {"a": "1"}
+    assert diff_events("JSON", parts, dict(parts), {"a": 1}) == []
+
+
+def test_json_diff_of_a_non_dict_sends_the_whole_value():
+    events = diff_events("JSON", {"": "[1]"}, {"": "[1, 2]"}, [1, 2])
+    assert patch(events) == {"set": [1, 2], "unset": []}
+
+
+def test_html_diff_sends_changed_blocks():
+    old = {"title": "Example", "content": "<p>1</p>"}
+    new = {"title": "Example", "content": "<p>2</p>"}
+    assert diff_events("html", old, new, None) == [("content", "<p>2</p>")]
+
+
+def test_publish_fans_out_diffs():
+    topic = Topic("test", "default_template.html")
+    queue = asyncio.Queue(maxsize=4)
+    topic.join("JSON", queue)
+
+    topic.publish({"count": 1, "name": "a"})
+    topic.publish({"count": 2, "name": "a"})
+    assert patch(queue.get_nowait()) == {
+        "set": {"count": 1, "name": "a"},
+        "unset": [],
+    }
+    assert patch(queue.get_nowait()) == {"set": {"count": 2}, "unset": []}
+    assert topic.stats()["renders"] == 2
+
+
+def test_late_subscriber_gets_a_snapshot():
+    topic = Topic("test", "default_template.html")
+    topic.publish({"count": 1})
+    queue = asyncio.Queue(maxsize=4)
+    topic.join("JSON", queue)
+    assert patch(queue.get_nowait()) == {"set": {"count": 1}, "unset": []}
+
+
+def test_slow_subscriber_is_resynced_with_a_snapshot():
+    topic = Topic("test", "default_template.html")
+    queue = asyncio.Queue(maxsize=1)
+    topic.join("JSON", queue)
+
+    topic.publish({"count": 1, "name": "a"})
+    topic.publish({"count": 2, "name": "a"})
+    assert queue.qsize() == 1
+    assert patch(queue.get_nowait()) == {
+        "set": {"count": 2, "name": "a"},
+        "unset": [],
+    }
+    assert topic.stats()["resyncs"] == 1
+
+
+def test_leaving_drops_the_format():
+    topic = Topic("test", "default_template.html")
+    queue = asyncio.Queue(maxsize=1)
+    topic.join("JSON", queue)
+    topic.leave("JSON", queue)
+    assert topic.subscribers == {}
+    assert topic.parts == {}
+
+
+def test_sse_rejects_formats_that_cannot_be_streamed(client):
+    response = client.get("/example/stream", headers={"accept": "application/pdf"})
+    assert response.status_code == 406
+    assert "cannot be streamed" in response.text
@@ -0,0 +1,89 @@
+import json
+
+import msgpack
+import pytest
+from fastapi import FastAPI
+from starlette.testclient import TestClient
+
+from fastapi_dynamic_response.base.schema import Message
+from fastapi_dynamic_response.main import app
+from fastapi_dynamic_response.serialization import DynamicJSONResponse
+from fastapi_dynamic_response.serialization import DynamicJSONRoute
+from fastapi_dynamic_response.serialization import RouteContent
+from fastapi_dynamic_response.serialization import route_content
+
+
+@pytest.fixture(scope="module")
+def client():
+    return TestClient(app)
+
+
+def render_with(holder, content, status_code=200):
+    token = route_content.set(holder)
+    try:
+        return DynamicJSONResponse(content, status_code=status_code).body
+    finally:
+        route_content.reset(token)
+
+
+def test_binary_formats_skip_the_json_body():
+    content = {"data": [1, 2, 3]}
+    holder = RouteContent(skip_json=True)
+    assert render_with(holder, content) == b""
+    assert holder.captured
+    assert holder.content is content
+
+
+def test_other_formats_capture_and_encode():
+    holder = RouteContent()
+    assert json.loads(render_with(holder, {"data": [1]})) == {"data": [1]}
+    assert holder.content == {"data": [1]}
+
+
+def test_errors_are_encoded_even_when_skipping_json():
+    holder = RouteContent(skip_json=True)
+    assert json.loads(render_with(holder, {"detail": "no"}, 404)) == {"detail": "no"}
+
+
+def test_only_the_route_output_is_captured():
+    holder = RouteContent(skip_json=True)
+    render_with(holder, {"route": True})
+    token = route_content.set(holder)
+    try:
+        assert DynamicJSONResponse({"later": True}).body == b'{"later":true}'
+    finally:
+        route_content.reset(token)
+    assert holder.content == {"route": True}
+
+
+def test_unsupported_types_fall_back_to_jsonable_encoder():
+    body = DynamicJSONResponse({"message": Message(message="hi")}).body
+    assert json.loads(body) == {"message": {"message": "hi"}}
+
+
+def test_direct_response_skips_response_models():
+    local = FastAPI(default_response_class=DynamicJSONResponse)
+    local.router.route_class = DynamicJSONRoute
+
+    @local.get("/direct")
+    async def direct():
+        return {"a": 1}
+
+    @local.get("/model", response_model=dict)
+    async def model():
+        return {"a": 1}
+
+    routes = {route.path: route for route in local.router.routes}
+    assert routes["/direct"].dependant.call is not direct
+    assert routes["/model"].dependant.call is model
+
+    local_client = TestClient(local)
+    assert local_client.get("/direct").json() == {"a": 1}
+    assert local_client.get("/model").json() == {"a": 1}
+
+
+def test_msgpack_is_encoded_from_the_route_output(client):
+    response = client.get("/example", headers={"accept": "application/msgpack"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/msgpack"
+    assert msgpack.unpackb(response.content)["data"] == [1, 2, 3, 4]
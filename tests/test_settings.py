@@ -0,0 +1,87 @@
+import io
+import os
+import secrets
+
+import pytest
+from pydantic import ValidationError
+from typer.testing import CliRunner
+
+from fastapi_dynamic_response import settings as settings_module
+from fastapi_dynamic_response.cli import app as cli_app
+from fastapi_dynamic_response.settings import ApiServer
+from fastapi_dynamic_response.settings import Settings
+from fastapi_dynamic_response.settings import available_cpus
+
+
+def test_local_accepts_the_default_session_secret_key():
+    assert Settings(ENV="local").SESSION_SECRET_KEY
+
+
+def test_other_envs_require_a_session_secret_key():
+    with pytest.raises(ValidationError, match="SESSION_SECRET_KEY"):
+        Settings(ENV="prod")
+    key = secrets.token_hex(16)
+    assert Settings(ENV="prod", SESSION_SECRET_KEY=key).SESSION_SECRET_KEY == key
+
+
+def fake_files(monkeypatch, files, cpus=8):
+    def fake_open(path):
+        if path not in files:
+            raise FileNotFoundError(path)
+        return io.StringIO(files[path])
+
+    monkeypatch.setattr(settings_module, "open", fake_open, raising=False)
+    monkeypatch.setattr(os, "sched_getaffinity", lambda _pid: set(range(cpus)))
+
+
+@pytest.mark.parametrize(
+    ("files", "expected"),
+    [
+        ({}, 8),
+        ({"/sys/fs/cgroup/cpu.max": "150000 100000\n"}, 1.5),
+        ({"/sys/fs/cgroup/cpu.max": "max 100000\n"}, 8),
+        ({"/sys/fs/cgroup/cpu.max": "2000000 100000\n"}, 8),
+        ({"/sys/fs/cgroup/cpu.max": "garbage\n"}, 8),
+        (
+            {
+                "/sys/fs/cgroup/cpu/cpu.cfs_quota_us": "250000\n",
+                "/sys/fs/cgroup/cpu/cpu.cfs_period_us": "100000\n",
+            },
+            2.5,
+        ),
+        (
+            {
+                "/sys/fs/cgroup/cpu/cpu.cfs_quota_us": "-1\n",
+                "/sys/fs/cgroup/cpu/cpu.cfs_period_us": "100000\n",
+            },
+            8,
+        ),
+    ],
+)
+def test_available_cpus_honors_cgroup_quotas(monkeypatch, files, expected):
+    fake_files(monkeypatch, files)
+    assert available_cpus() == expected
+
+
+def test_auto_workers_round_the_quota_up(monkeypatch):
+    fake_files(monkeypatch, {"/sys/fs/cgroup/cpu.max": "150000 100000\n"})
+    assert ApiServer(workers="auto").worker_count() == 2
+    assert ApiServer(workers=3).uvicorn_kwargs()["workers"] == 3
+
+
+def test_reload_defaults_to_local_only():
+    assert Settings(ENV="local").api_server.reload
+    key = secrets.token_hex(16)
+    assert not Settings(ENV="prod", SESSION_SECRET_KEY=key).api_server.reload
+
+
+def test_run_refuses_reload_outside_local(monkeypatch):
+    prod = Settings(
+        ENV="prod",
+        SESSION_SECRET_KEY=secrets.token_hex(16),
+        api_server=ApiServer(reload=True),
+    )
+    monkeypatch.setattr(cli_app, "settings", prod)
+    result = CliRunner().invoke(cli_app.app_app, ["run"])
+    assert result.exit_code != 0
+    assert "only allowed when ENV is local" in result.output
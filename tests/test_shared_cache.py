@@ -0,0 +1,85 @@
+from fastapi_dynamic_response.settings import RenderCache
+from fastapi_dynamic_response.shared_cache import SharedRenderCache
+from fastapi_dynamic_response.shared_cache import cache_key
+from fastapi_dynamic_response.shared_cache import source_digest
+
+BUILD = b"build-one".ljust(16, b"\0")
+
+
+def make_cache(tmp_path, build=BUILD, **options):
+    options = {"slots": 4, "slot_size": 1024, "ways": 2, **options}
+    config = RenderCache(path=str(tmp_path / "render-cache"), **options)
+    return SharedRenderCache(config, build=build)
+
+
+def test_cache_key_separates_parts():
+    assert cache_key("ab", "c") != cache_key("a", "bc")
+    assert cache_key(b"data") == cache_key(b"data")
+
+
+def test_round_trip(tmp_path):
+    cache = make_cache(tmp_path)
+    key = cache_key("html", "example.html")
+    assert cache.get(key) is None
+    assert cache.set(key, b"<p>hi</p>", "text/html; charset=utf-8")
+
+    body, content_type = cache.get(key)
+    assert body == b"<p>hi</p>"
+    assert content_type == "text/html; charset=utf-8"
+    assert cache.stats()["hits"] == 1
+
+
+def test_same_build_shares_the_file(tmp_path):
+    key = cache_key("html")
+    make_cache(tmp_path).set(key, b"shared", "text/html")
+    assert make_cache(tmp_path).get(key)[0] == b"shared"
+
+
+def test_new_build_resets_the_file(tmp_path):
+    key = cache_key("html")
+    make_cache(tmp_path).set(key, b"old release", "text/html")
+    assert make_cache(tmp_path, build=b"build-two".ljust(16, b"\0")).get(key) is None
+
+
+def test_oversized_renders_are_skipped(tmp_path):
+    cache = make_cache(tmp_path)
+    assert not cache.set(cache_key("big"), b"x" * 2048, "text/html")
+    assert cache.stats()["skipped"] == 1
+
+
+def test_source_digest_follows_template_changes(tmp_path):
+    template = tmp_path / "example.html"
+    template.write_text("<p>{{ data }}</p>")
+    before = source_digest(str(tmp_path))
+    assert source_digest(str(tmp_path)) == before
+
+    template.write_text("<div>{{ data }}</div>")
+    assert source_digest(str(tmp_path)) != before
+
+
+def test_hits_survive_the_slot_being_reused(tmp_path):
+    cache = make_cache(tmp_path, slots=1, ways=1)
+    cache.set(cache_key("first"), b"first page", "text/html")
+    body, _ = cache.get(cache_key("first"))
+
+    cache.set(cache_key("second"), b"second page", "text/html")
+    assert cache.get(cache_key("first")) is None
+    assert body == b"first page"
+
+
+def test_build_is_computed_on_first_use(tmp_path):
+    calls = []
+
+    def build():
+        calls.append(1)
+        return BUILD
+
+    cache = make_cache(tmp_path, build=build)
+    assert not calls
+    cache.set(cache_key("html"), b"page", "text/html")
+    cache.get(cache_key("html"))
+    assert calls == [1]
+
+    disabled = make_cache(tmp_path / "off", build=build, enabled=False)
+    assert disabled.get(cache_key("html")) is None
+    assert calls == [1]
@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+from starlette.requests import Request
+
+from fastapi_dynamic_response.middleware import Prefers
+from fastapi_dynamic_response.middleware import render_key
+from fastapi_dynamic_response.singleflight import SingleFlight
+
+
+def make_request(path="/example", headers=None, **scope):
+    raw_headers = [
+        (name.encode(), value.encode()) for name, value in (headers or {}).items()
+    ]
+    return Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "path": path,
+            "query_string": b"",
+            "headers": raw_headers,
+            "state": {"prefers": Prefers(html=True), "content_type": "text/html"},
+            **scope,
+        }
+    )
+
+
+def test_concurrent_calls_share_one_run():
+    flights = SingleFlight()
+    calls = 0
+
+    async def render():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    async def main():
+        return await asyncio.gather(*(flights.do("key", render) for _ in range(3)))
+
+    results = asyncio.run(main())
+    assert calls == 1
+    assert sorted(results) == [(1, False), (1, True), (1, True)]
+    assert flights.stats()["coalesced"] == 2
+    assert flights.stats()["in_flight"] == 0
+
+
+def test_failures_are_not_cached():
+    flights = SingleFlight()
+
+    async def fail():
+        raise ValueError
+
+    async def succeed():
+        return "ok"
+
+    with pytest.raises(ValueError):
+        asyncio.run(flights.do("key", fail))
+    assert asyncio.run(flights.do("key", succeed)) == ("ok", False)
+    assert flights.stats()["failures"] == 1
+
+
+def test_render_key_matches_equal_requests():
+    assert render_key(make_request()) == render_key(make_request())
+    assert render_key(make_request()) != render_key(make_request("/another"))
+    assert render_key(make_request()) != render_key(
+        make_request(headers={"hx-target": "main"})
+    )
+
+
+def test_render_key_skips_requests_with_cookies():
+    assert render_key(make_request(headers={"cookie": "session=abc"})) is None
+
+
+def test_render_key_skips_session_routes():
+    assert render_key(make_request("/visits", session={})) is None
+
+
+def test_render_key_skips_event_streams():
+    assert render_key(make_request(headers={"accept": "text/event-stream"})) is None
@@ -0,0 +1,38 @@
+import pytest
+from starlette.testclient import TestClient
+
+from fastapi_dynamic_response.main import app
+
+SUPERUSER = {"authorization": "Basic user3:supersecurepassword"}
+PROFILE = "/debug/profile?seconds=0.01&interval=0.001"
+
+
+@pytest.fixture(scope="module")
+def client():
+    return TestClient(app)
+
+
+def test_profile_svg_is_passed_through(client):
+    response = client.get(f"{PROFILE}&format=svg", headers=SUPERUSER)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/svg+xml"
+    assert response.text.strip().startswith("<svg")
+
+
+def test_profile_collapsed_is_passed_through(client):
+    response = client.get(f"{PROFILE}&format=collapsed", headers=SUPERUSER)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+
+
+def test_profile_format_overrides_negotiation(client):
+    response = client.get(
+        f"{PROFILE}&format=json", headers={**SUPERUSER, "accept": "text/html"}
+    )
+    assert response.status_code == 200
+    assert response.json()["samples"] > 0
+
+
+def test_profile_requires_superuser(client):
+    response = client.get(PROFILE, headers={"authorization": "Basic user1:password123"})
+    assert response.status_code == 403